@@ -2,74 +2,211 @@ import logging
 import smtplib
 from datetime import datetime
 from email.message import EmailMessage
-from functools import wraps
+from functools import partial, wraps
 from hashlib import md5
 from logging.handlers import RotatingFileHandler
 from os import environ, urandom
-from typing import Optional, Sequence
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Tuple
 from urllib.parse import urlencode
 
+import click
 from dotenv import load_dotenv
-from flask import (Flask, abort, flash, redirect, render_template, request,
-                   url_for)
+from flask import (Flask, abort, current_app, flash, redirect,
+                   render_template, request, url_for)
 from flask_bootstrap import Bootstrap5
 from flask_ckeditor import CKEditor
-# santize user input before saving to db
-from flask_ckeditor.utils import cleanify
+from flask.cli import with_appcontext
 from flask_login import (LoginManager, current_user, login_required,
                          login_user, logout_user)
 # from flask_migrate import Migrate
 from flask_wtf import CSRFProtect
-from sqlalchemy import select, update
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+import services
 from forms import CreatePost, LoginUser, SignUpUser, UsersComments
 from models import Comments, Post, User, db
+from rate_limit import RateLimiter
+from sanitize import sanitizer
+from view_counter import ViewCounter
+from warmup import WarmUp
 
 # from flask_gravatar import Gravatar
 
 
 load_dotenv('.env')
 
-secret_key: bytes = urandom(32)
-
-app: Flask = Flask(__name__)
-app.config['SECRET_KEY'] = secret_key
-app.config['SQLALCHEMY_DATABASE_URI'] = environ.get(
-    'DB_URI', 'sqlite:///posts.db')
-db.init_app(app)
-# Migrate(app, db)
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
-bootstrap = Bootstrap5(app)
-crsf = CSRFProtect(app)
-ckeditor = CKEditor(app)
+bootstrap = Bootstrap5()
+crsf = CSRFProtect()
+ckeditor = CKEditor()
+limiter = RateLimiter()
+
+# views registered on every app built by create_app
+_routes: List[Tuple[str, Callable, dict]] = []
+
+
+def route(rule: str, **options):
+    """Collect a view for create_app, keeping endpoint names unprefixed."""
+
+    def decorator(func):
+        _routes.append((rule, func, options))
+        return func
+
+    return decorator
+
+
+def secret_keys() -> Tuple[Optional[str], List[str]]:
+    """Read the session signing key and the keys it replaced.
+
+    ``SECRET_KEY`` must be the same on every worker and node, otherwise a
+    request that lands on another process cannot read the session or the
+    CSRF token. During rotation the old keys go in the comma separated
+    ``SECRET_KEY_FALLBACKS`` (newest last) so existing sessions and forms
+    stay valid until they expire.
 
-# Logging configuration
-log_formatter = logging.Formatter(
-    '%(asctime)s %(levelname)s [%(name)s] %(message)s'
-)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(log_formatter)
-stream_handler.setLevel(logging.INFO)
+    The key is ``None`` when unset; create_app only generates one if the
+    explicit config does not provide it either.
+    """
+
+    current = environ.get('SECRET_KEY') or None
+
+    fallbacks = [key.strip()
+                 for key in environ.get('SECRET_KEY_FALLBACKS', '').split(',')
+                 if key.strip()]
+
+    return current, fallbacks
+
+
+def default_config() -> dict:
+    """Build the app configuration from the environment."""
+
+    current_key, fallback_keys = secret_keys()
+
+    return {
+        'SECRET_KEY': current_key,
+        'SECRET_KEY_FALLBACKS': fallback_keys,
+        'SQLALCHEMY_DATABASE_URI': environ.get(
+            'DB_URI', 'sqlite:///posts.db'),
+        'VIEW_COUNTER_FLUSH_INTERVAL': float(
+            environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 10)),
+        'VIEW_COUNTER_FLUSH_THRESHOLD': int(
+            environ.get('VIEW_COUNTER_FLUSH_THRESHOLD', 500)),
+        # per-route limits as '<amount>/<second|minute|hour|day>';
+        # empty disables
+        'RATELIMIT_STRATEGY': environ.get(
+            'RATELIMIT_STRATEGY', 'sliding-window'),
+        'RATELIMIT_MAX_KEYS': int(environ.get('RATELIMIT_MAX_KEYS', 10000)),
+        'RATELIMIT_LOGIN': environ.get('RATELIMIT_LOGIN', '10/minute'),
+        'RATELIMIT_REGISTER': environ.get('RATELIMIT_REGISTER', '5/hour'),
+        'RATELIMIT_COMMENT': environ.get('RATELIMIT_COMMENT', '10/minute'),
+        'RATELIMIT_CONTACT': environ.get('RATELIMIT_CONTACT', '3/hour'),
+        # reverse proxies in front of the app (e.g. 1 behind the Heroku
+        # router); their X-Forwarded-For is trusted so rate limits key on
+        # the client's address, not the proxy's. 0 trusts nothing.
+        'PROXY_FIX_HOPS': int(environ.get('PROXY_FIX_HOPS', 0)),
+        # comma separated tags allowed in posts and comments; empty keeps
+        # defaults
+        'SANITIZE_ALLOWED_TAGS': [
+            tag.strip()
+            for tag in environ.get('SANITIZE_ALLOWED_TAGS', '').split(',')
+            if tag.strip()],
+        'RELATED_POSTS_K': int(environ.get('RELATED_POSTS_K', 3)),
+        # shared by all workers on a host; empty disables the cache
+        'JINJA_BYTECODE_CACHE_DIR': environ.get('JINJA_BYTECODE_CACHE_DIR'),
+        'WARMUP_ON_START': environ.get('WARMUP_ON_START', '1') != '0',
+        'WARMUP_POOL_CONNECTIONS': int(
+            environ.get('WARMUP_POOL_CONNECTIONS', 2)),
+    }
+
+
+def configure_logging(app: Flask) -> None:
+    """Send app logs to stderr and a rotating log file."""
+
+    log_formatter = logging.Formatter(
+        '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+    )
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(log_formatter)
+    stream_handler.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'suip-blog-web.log', maxBytes=5 * 1024 * 1024, backupCount=3
+    )
+    file_handler.setFormatter(log_formatter)
+    file_handler.setLevel(logging.INFO)
 
-file_handler = RotatingFileHandler(
-    'suip-blog-web.log', maxBytes=5 * 1024 * 1024, backupCount=3
-)
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.INFO)
+    app.logger.setLevel(logging.INFO)
 
-app.logger.setLevel(logging.INFO)
+    # avoid adding duplicate handlers when module reloaded
+    if not any(isinstance(h, RotatingFileHandler)
+               for h in app.logger.handlers):
+        app.logger.addHandler(stream_handler)
+        app.logger.addHandler(file_handler)
 
-# avoid adding duplicate handlers when module reloaded
-if not any(isinstance(h, RotatingFileHandler) for h in app.logger.handlers):
-    app.logger.addHandler(stream_handler)
-    app.logger.addHandler(file_handler)
 
-# with app.app_context():
-#     # db.drop_all()
-#     db.create_all()
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """Build and configure a Flask app.
+
+    Args:
+        config (Mapping): Settings overriding the environment defaults,
+            e.g. a test database URI
+
+    Returns:
+        Flask: The configured application
+    """
+
+    app = Flask(__name__)
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+
+    if not app.config['SECRET_KEY']:
+        # fine for a single dev server, breaks logins across workers
+        logging.getLogger(__name__).warning(
+            'SECRET_KEY is not set; using a random per-process key')
+        app.config['SECRET_KEY'] = urandom(32).hex()
+
+    # Flask-WTF signs CSRF tokens with one key; a list lets itsdangerous
+    # sign with the newest and still accept tokens from the old ones
+    app.config.setdefault('WTF_CSRF_SECRET_KEY', [
+        *app.config['SECRET_KEY_FALLBACKS'], app.config['SECRET_KEY']])
+
+    if app.config['PROXY_FIX_HOPS']:
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops,
+                                x_host=hops)
+
+    db.init_app(app)
+    # Migrate(app, db)
+    login_manager.init_app(app)
+    bootstrap.init_app(app)
+    crsf.init_app(app)
+    ckeditor.init_app(app)
+    ViewCounter(app)
+    limiter.init_app(app)
+    sanitizer.init_app(app)
+
+    configure_logging(app)
+    app.jinja_env.globals.update(gravatar_url=gravatar_url)
+
+    for rule, view_func, options in _routes:
+        app.add_url_rule(rule, view_func=view_func, **options)
+    app.cli.add_command(related_posts_command)
+    app.cli.add_command(rebuild_archive_counts_command)
+    app.cli.add_command(upgrade_db_command)
+
+    # last, so it compiles templates and opens connections of a fully
+    # configured app
+    WarmUp(app)
+
+    # with app.app_context():
+    #     # db.drop_all()
+    #     db.create_all()
+
+    return app
 
 
 year: int = datetime.now().year
@@ -95,22 +232,24 @@ def gravatar_url(email, size=100, default='retro', rating='g'):
     return f"https://www.gravatar.com/avatar/{email_hash}?{params}"
 
 
-app.jinja_env.globals.update(gravatar_url=gravatar_url)
+# helper
+def _view_counter() -> ViewCounter:
+    return current_app.extensions['view_counter']
+
+
+def _is_admin(admin: Optional[User]) -> bool:
+    return admin is not None and current_user.get_id() == str(admin.id)
 
 
-# helper
 def admins_only(func):
     """Decorator to restrict access to admin users only.
 
-    If the user is not an admin, aborts with 403 Forbidden.
+    If the logged-in user is not the admin, aborts with 403 Forbidden.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
         admin: Optional[User] = db.session.get(User, 1)
-        if admin is None:
-            flash('Admins only!', category='danger')
-            return abort(403)
-        if not admin:
+        if not _is_admin(admin):
             flash('Admins only!', category='danger')
             return abort(403)
 
@@ -132,7 +271,8 @@ def load_user(user_id):
     return db.session.get(User, int(user_id))
 
 
-@app.route('/register-user', methods=['POST', 'GET'])
+@route('/register-user', methods=['POST', 'GET'])
+@limiter.limit('register', keys=('ip',))
 def register_user():
     """Handle user registration.
 
@@ -147,15 +287,11 @@ def register_user():
     form = SignUpUser()
 
     if form.validate_on_submit():
-        user = User(
-            username=form.username.data,
-            email=form.email.data,
-        )
-        user.set_password(form.confirm_password.data)
-
         try:
-            db.session.add(user)
-            db.session.commit()
+            with services.unit_of_work():
+                services.register_user(form.username.data,
+                                       form.email.data,
+                                       form.confirm_password.data)
             flash('Account registered successfully!', category='success')
             next_url = url_for('login')
 
@@ -166,7 +302,6 @@ def register_user():
 
         except Exception:
             flash('Failed to add account!', category='danger')
-            db.session.rollback()
 
     return render_template('register.html',
                            form=form,
@@ -175,7 +310,8 @@ def register_user():
                            github=environ.get('GITHUB'))
 
 
-@app.route('/login', methods=['POST', 'GET'])
+@route('/login', methods=['POST', 'GET'])
+@limiter.limit('login', keys=('ip', 'email'))
 def login():
     """Handle user login.
 
@@ -189,14 +325,15 @@ def login():
 
     form = LoginUser()
 
-    user: Optional[User] = db.session.scalar(
-        select(User).where(User.email == form.email.data))
+    # a plain GET has nothing to look up
+    if form.validate_on_submit():
+        user: Optional[User] = services.find_user_by_email(form.email.data)
 
-    if user is None:
-        flash('Do not have an account? Register an account for free', 'danger')
+        if user is None:
+            flash('Do not have an account? Register an account for free',
+                  'danger')
 
-    else:
-        if user.check_password(form.password.data):
+        elif user.check_password(form.password.data):
             login_user(user, remember=True)
             flash(f'{user.username.split()[0]} has logged in!')
             next_url = request.args.get('next') or url_for('home')
@@ -213,49 +350,30 @@ def login():
                            github=environ.get('GITHUB'))
 
 
-@app.route('/')
+@route('/')
 def home():
     """Render the home page with latest blog posts.
 
-    Shows up to 3 most recent posts if available.
+    Shows up to 3 most recent posts if available, plus the most read
+    posts precomputed by the view counter.
     """
 
     admin: Optional[User] = db.session.get(User, 1)
+    most_read = _view_counter().top_posts()
 
-    blog_data: Sequence[Post] = db.session.execute(
-        select(Post).order_by(Post.date.desc())
-    ).scalars().all()
-
-    if blog_data:
-        if len(blog_data) > 2:
-            return render_template(
-                'index.html',
-                slice_blog_data=blog_data[:3],
-                year=year,
-                admin=admin,
-                whatsapp=environ.get('WHATSAPP'),
-                github=environ.get('GITHUB')
-            )
+    blog_data: Sequence[Post] = services.latest_posts(3)
 
-        else:
-            return render_template(
-                'index.html',
-                slice_blog_data=blog_data,
-                year=year,
-                admin=admin,
-                whatsapp=environ.get('WHATSAPP'),
-                github=environ.get('GITHUB'))
-
-    else:
-        return render_template(
-            'index.html',
-            year=year,
-            admin=admin,
-            whatsapp=environ.get('WHATSAPP'),
-            github=environ.get('GITHUB'))
-
-
-@app.route('/all-blogs')
+    return render_template(
+        'index.html',
+        slice_blog_data=blog_data,
+        most_read=most_read,
+        year=year,
+        admin=admin,
+        whatsapp=environ.get('WHATSAPP'),
+        github=environ.get('GITHUB'))
+
+
+@route('/all-blogs')
 def all_blogs():
     """Render paginated list of all blog posts.
 
@@ -264,7 +382,8 @@ def all_blogs():
 
     page: int = request.args.get('page', 1, type=int)
     blogs_per_page = db.paginate(
-        select(Post).order_by(Post.date.desc()),
+        select(Post).where(Post.hidden.is_(False))
+        .order_by(Post.date.desc()),
         page=page,
         per_page=15,
         error_out=False
@@ -276,17 +395,90 @@ def all_blogs():
     prev_page = url_for('all_blogs', page=blogs_per_page.prev_num) \
         if blogs_per_page.has_prev else None
 
+    archive_tags, archive_months = services.archive_sidebar()
+
     return render_template('allBlogs.html',
                            blogs=blogs_per_page.items,
                            next_page=next_page,
                            prev_page=prev_page,
+                           archive_tags=archive_tags,
+                           archive_months=archive_months,
+                           year=year,
+                           admin=db.session.get(User, 1),
+                           whatsapp=environ.get('WHATSAPP'),
+                           github=environ.get('GITHUB'))
+
+
+@route('/tag/<slug>')
+def tag_posts(slug: str):
+    """Render posts carrying a tag, newest first.
+
+    Args:
+        slug (str): URL form of the tag name
+
+    Pages are keyset based: ``?before=<cursor>`` continues after the last
+    post of the previous page.
+    """
+
+    tag, posts, next_cursor = services.tag_page(
+        slug, request.args.get('before'), per_page=15)
+
+    if tag is None:
+        flash('Tag not found!', category='danger')
+        return redirect(url_for('all_blogs'))
+
+    next_page = url_for('tag_posts', slug=slug, before=next_cursor) \
+        if next_cursor else None
+    archive_tags, archive_months = services.archive_sidebar()
+
+    return render_template('allBlogs.html',
+                           blogs=posts,
+                           heading=f'Tagged: {tag.name}',
+                           next_page=next_page,
+                           archive_tags=archive_tags,
+                           archive_months=archive_months,
                            year=year,
                            admin=db.session.get(User, 1),
                            whatsapp=environ.get('WHATSAPP'),
                            github=environ.get('GITHUB'))
 
 
-@app.route('/post/<int:post_id>', methods=['GET', 'POST'])
+@route('/archive/<int:archive_year>/<int:month>')
+def month_posts(archive_year: int, month: int):
+    """Render the posts published in one month, newest first.
+
+    Args:
+        archive_year (int): Year of the archive
+        month (int): Month of the archive, 1-12
+
+    Uses the same keyset ``?before=<cursor>`` paging as tag pages.
+    """
+
+    if not 1 <= month <= 12 or not 1 <= archive_year <= 9999:
+        abort(404)
+
+    posts, next_cursor = services.month_page(
+        archive_year, month, request.args.get('before'), per_page=15)
+
+    next_page = url_for('month_posts', archive_year=archive_year,
+                        month=month, before=next_cursor) \
+        if next_cursor else None
+    archive_tags, archive_months = services.archive_sidebar()
+
+    return render_template('allBlogs.html',
+                           blogs=posts,
+                           heading=f'{datetime(archive_year, month, 1):%B %Y}',
+                           next_page=next_page,
+                           archive_tags=archive_tags,
+                           archive_months=archive_months,
+                           year=year,
+                           admin=db.session.get(User, 1),
+                           whatsapp=environ.get('WHATSAPP'),
+                           github=environ.get('GITHUB'))
+
+
+@route('/post/<int:post_id>', methods=['GET', 'POST'])
+@limiter.limit('comment', keys=('ip', 'user'))
 def show_post(post_id: int):
     """Display a single blog post and handle comments.
 
@@ -303,6 +495,10 @@ def show_post(post_id: int):
 
     post_to_disp: Optional[Post] = db.session.get(Post, post_id)
 
+    # hidden posts stay readable for the admin who is moderating them
+    if post_to_disp and post_to_disp.hidden and not _is_admin(admin):
+        post_to_disp = None
+
     if not post_to_disp:
         flash('Post not found!', category='danger')
         return redirect(url_for('home'))
@@ -312,27 +508,40 @@ def show_post(post_id: int):
 
     date_composed = str(post_to_disp.date).split()[0]
 
+    view_counter = _view_counter()
+    if request.method == 'GET':
+        view_counter.incr(post_id)
+    # flushed total plus what this worker has not written yet
+    views: int = (post_to_disp.views or 0) + view_counter.pending(post_id)
+
     if comments_form.validate_on_submit():
         if not current_user.is_authenticated:
             flash('Login to add comment!', category='danger')
             return redirect(url_for('login'))
 
         try:
-            user_comment: Comments = Comments(
-                comment=cleanify(comments_form.comment.data),
-                the_user=current_user,
-                blog_post=post_to_disp
-            )
-            db.session.add(user_comment)
-            db.session.commit()
+            with services.unit_of_work():
+                services.add_comment(post_to_disp,
+                                     current_user._get_current_object(),
+                                     comments_form.comment.data)
 
         except Exception:
-            app.logger.exception('Unexpected error happened adding comment')
+            current_app.logger.exception(
+                'Unexpected error happened adding comment')
             flash('Failed to add comment', category='error')
-            db.session.rollback()
 
-    comments: Sequence[Comments] = db.session.scalars(
-        select(Comments).where(Comments.post_id == post_id)).all()
+    comments: Sequence[Comments] = services.post_comments(post_id)
+    related = services.related_posts(post_id)
+
+    # rows written before the current allow-list are re-cleaned once
+    stale = services.stale_sanitized(post_to_disp, comments)
+    if stale:
+        try:
+            with services.unit_of_work():
+                services.resanitize(stale)
+
+        except Exception:
+            current_app.logger.exception('Failed to store re-sanitized HTML')
 
     return render_template(
         'post.html',
@@ -342,12 +551,14 @@ def show_post(post_id: int):
         username=username,
         form=comments_form,
         comments=comments,
+        related=related,
         date_composed=date_composed,
+        views=views,
         whatsapp=environ.get('WHATSAPP'),
         github=environ.get('GITHUB'))
 
 
-@app.route('/add-post', methods=['POST', 'GET'])
+@route('/add-post', methods=['POST', 'GET'])
 @login_required
 def add_post():
     """Handle creation of new blog posts.
@@ -359,34 +570,27 @@ def add_post():
 
     if form.validate_on_submit():
         try:
-            new_post = Post(
-                title=form.title.data,
-                subtitle=form.subtitle.data,
-                body=cleanify(form.body.data),
-                img_url=form.img_url.data or url_for(
-                    'static', filename='assets/img/post-bg.jpg'),
-                author=current_user
-            )
-            db.session.add(new_post)
-            db.session.commit()
-
-            added_post: Optional[Post] = db.session.get(Post, new_post.id)
-            if not added_post:
-                flash('Failed to verify post creation', category='error')
-                return redirect(url_for('home'))
+            # commit() raising is the failure signal; no need to re-read
+            with services.unit_of_work():
+                services.create_post(
+                    current_user._get_current_object(),
+                    title=form.title.data,
+                    subtitle=form.subtitle.data,
+                    body=form.body.data,
+                    img_url=form.img_url.data or url_for(
+                        'static', filename='assets/img/post-bg.jpg'),
+                    tags=form.tags.data)
 
             flash('Successfullly added!', category='success')
             return redirect(url_for('home'))
 
         except IntegrityError as ie:
-            app.logger.warning('IntegrityError adding post %s', ie)
+            current_app.logger.warning('IntegrityError adding post %s', ie)
             flash('Post with this title already exists', category='error')
-            db.session.rollback()
 
         except Exception:
-            app.logger.exception('Error adding post')
+            current_app.logger.exception('Error adding post')
             flash('Failed to add post', category='error')
-            db.session.rollback()
 
             return render_template('create-post.html',
                                    form=form, year=year,
@@ -400,7 +604,7 @@ def add_post():
                            github=environ.get('GITHUB'))
 
 
-@app.route('/edit-post/<int:post_id>', methods=['POST', 'GET'])
+@route('/edit-post/<int:post_id>', methods=['POST', 'GET'])
 @login_required
 @admins_only
 def edit_post(post_id: int):
@@ -421,28 +625,26 @@ def edit_post(post_id: int):
 
     if form.validate_on_submit():
         try:
-            db.session.execute(
-                update(Post).where(Post.id == post_id).values(
+            with services.unit_of_work():
+                services.update_post(
+                    post_to_edit,
                     title=form.title.data,
                     subtitle=form.subtitle.data,
-                    body=cleanify(form.body.data),
-                    img_url=form.img_url.data
-                )
-            )
-            db.session.commit()
+                    body=form.body.data,
+                    img_url=form.img_url.data,
+                    tags=form.tags.data)
+            _view_counter().invalidate()
             flash('Post updated successfully!', category='success')
 
             return redirect(url_for('show_post', post_id=post_id))
 
         except IntegrityError as ie:
-            app.logger.warning('IntegrityError updating post %s', ie)
+            current_app.logger.warning('IntegrityError updating post %s', ie)
             flash('Your new title is used by someone...Modify it!', 'danger')
-            db.session.rollback()
 
         except Exception:
-            app.logger.exception('Error updating post')
+            current_app.logger.exception('Error updating post')
             flash('Failed to update!', category='error')
-            db.session.rollback()
 
             return redirect(url_for('show_post', post_id=post_id))
 
@@ -450,6 +652,7 @@ def edit_post(post_id: int):
     form.subtitle.data = post_to_edit.subtitle
     form.body.data = post_to_edit.body
     form.img_url.data = post_to_edit.img_url
+    form.tags.data = ', '.join(tag.name for tag in post_to_edit.tags)
 
     post_title: str = post_to_edit.title
 
@@ -462,7 +665,7 @@ def edit_post(post_id: int):
         github=environ.get('GITHUB'))
 
 
-@app.route('/delete-post/<int:post_id>')
+@route('/delete-post/<int:post_id>')
 @login_required
 @admins_only
 def delete_post(post_id: int):
@@ -481,19 +684,115 @@ def delete_post(post_id: int):
         return redirect(url_for('home'))
 
     try:
-        db.session.delete(post_to_delete)
-        db.session.commit()
+        with services.unit_of_work():
+            services.delete_post(post_to_delete)
+        _view_counter().invalidate()
         flash('Post deleted!', category='success')
 
     except Exception as e:
         flash('Failed to delete!', category='error')
-        app.logger.exception('Failed to delete post: %s', e)
-        db.session.rollback()
+        current_app.logger.exception('Failed to delete post: %s', e)
 
     return redirect(url_for('all_blogs'))
 
 
-@app.route('/about')
+# (kind, action) -> (service, past tense for the flash message)
+_MODERATION_ACTIONS = {
+    ('comments', 'delete'): (services.delete_comments, 'Deleted'),
+    ('comments', 'hide'): (services.hide_comments, 'Hid'),
+    ('comments', 'unhide'): (partial(services.hide_comments, hidden=False),
+                             'Restored'),
+    ('posts', 'delete'): (services.delete_posts, 'Deleted'),
+    ('posts', 'hide'): (services.hide_posts, 'Hid'),
+    ('posts', 'unhide'): (partial(services.hide_posts, hidden=False),
+                          'Restored'),
+}
+
+
+@route('/admin/moderation', methods=['POST', 'GET'])
+@login_required
+@admins_only
+def moderation():
+    """List recent comments and posts and act on many of them at once.
+
+    The form posts ``kind`` (``comments`` or ``posts``), ``action``
+    (``delete``, ``hide`` or ``unhide``) and the selected ``ids``; the
+    whole selection is handled in one transaction.
+
+    Requires admin privileges.
+    """
+
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        action = _MODERATION_ACTIONS.get((kind, request.form.get('action')))
+        ids = request.form.getlist('ids', type=int)
+
+        if action is None or not ids:
+            flash('Select an action and at least one item!',
+                  category='danger')
+            return redirect(url_for('moderation'))
+
+        service, done = action
+        try:
+            with services.unit_of_work():
+                changed = service(ids)
+            if kind == 'posts':
+                _view_counter().invalidate()
+            flash(f'{done} {changed} {kind}!', category='success')
+
+        except Exception:
+            current_app.logger.exception('Moderation of %s failed', kind)
+            flash('Moderation failed!', category='error')
+
+        return redirect(url_for('moderation'))
+
+    comments, posts = services.moderation_queue(50)
+
+    return render_template('moderation.html',
+                           comments=comments,
+                           posts=posts,
+                           year=year,
+                           admin=db.session.get(User, 1),
+                           whatsapp=environ.get('WHATSAPP'),
+                           github=environ.get('GITHUB'))
+
+
+@route('/admin/purge-user/<int:user_id>', methods=['POST'])
+@login_required
+@admins_only
+def purge_user(user_id: int):
+    """Delete a spam account with every post and comment it wrote.
+
+    Args:
+        user_id (int): ID of the user to purge
+
+    Requires admin privileges; the admin account itself cannot be purged.
+    """
+
+    admin: Optional[User] = db.session.get(User, 1)
+    if admin and admin.id == user_id:
+        flash('The admin cannot be purged!', category='danger')
+        return redirect(url_for('moderation'))
+
+    try:
+        with services.unit_of_work():
+            purged = services.purge_user(user_id)
+        _view_counter().invalidate()
+
+        if purged['users']:
+            flash(f"User purged with {purged['posts']} post(s) and "
+                  f"{purged['comments']} comment(s)!", category='success')
+        else:
+            flash('User not exist!', category='danger')
+
+    except Exception:
+        current_app.logger.exception('Failed to purge user %s', user_id)
+        flash('Failed to purge user!', category='error')
+
+    return redirect(url_for('moderation'))
+
+
+@route('/about')
 def about_page():
     """Render the about page."""
 
@@ -503,7 +802,8 @@ def about_page():
                            portfolio_site=environ.get('PORTFOLIO'),)
 
 
-@app.route('/contact', methods=['POST', 'GET'])
+@route('/contact', methods=['POST', 'GET'])
+@limiter.limit('contact', keys=('ip', 'user'))
 @login_required
 def contact_page():
     """Handle contact form submissions.
@@ -539,7 +839,73 @@ def contact_page():
                            github=environ.get('GITHUB'))
 
 
-@app.route('/logging-out')
+@click.command('related-posts')
+@click.option('--full', is_flag=True,
+              help='Recompute every post, not only added/edited ones.')
+@with_appcontext
+def related_posts_command(full: bool):
+    """Recompute the precomputed related-posts table.
+
+    Run it from cron or the release phase; requests only read the table.
+    """
+
+    # numpy/scipy are only needed by this batch job, not by web workers
+    from related import recompute_related
+
+    updated = recompute_related(current_app.config['RELATED_POSTS_K'],
+                                full=full)
+    click.echo(f'Recomputed related posts for {updated} post(s)')
+
+
+@click.command('rebuild-archive-counts')
+@with_appcontext
+def rebuild_archive_counts_command():
+    """Recount posts per tag and month, e.g. after adding the table."""
+
+    with services.unit_of_work():
+        written = services.rebuild_archive_counts()
+    click.echo(f'Wrote {written} archive counter(s)')
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Add tables, columns and indexes missing from an existing database."""
+
+    from schema import upgrade_schema
+
+    changes = upgrade_schema()
+    for change in changes:
+        click.echo(change)
+    click.echo(f'Database up to date ({len(changes)} change(s))')
+
+
+@route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and answering."""
+
+    return {'status': 'ok'}
+
+
+@route('/readyz')
+def readyz():
+    """Readiness probe: 200 only once templates and DB pool are warm.
+
+    A warm-up step that failed at startup (e.g. DB not reachable yet) is
+    retried here, so the worker turns ready as soon as it can.
+    """
+
+    warmup: WarmUp = current_app.extensions['warmup']
+    ready = warmup.ready or warmup.run()
+
+    body = {'status': 'ready' if ready else 'warming up',
+            'templates': warmup.templates_loaded,
+            'pool_primed': warmup.pool_primed}
+
+    return body, 200 if ready else 503
+
+
+@route('/logging-out')
 def logout():
     """Handle user logout.
 
@@ -550,4 +916,4 @@ def logout():
 
 
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
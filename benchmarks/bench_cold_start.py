@@ -0,0 +1,109 @@
+"""Measure import-to-first-response time of a fresh worker process.
+
+Each run starts a new interpreter that imports the app, builds it with
+create_app and serves ``GET /`` and ``GET /post/1`` through the test
+client, which is what the first requests to a freshly forked worker pay.
+Scenarios:
+
+* ``lazy``: no bytecode cache, no warm-up (the old behaviour)
+* ``warm-up, cold cache``: warm-up on, empty bytecode cache directory
+* ``warm-up, warm cache``: warm-up on, cache filled by an earlier worker
+
+Usage::
+
+    python benchmarks/bench_cold_start.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from statistics import median
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = r'''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({'VIEW_COUNTER_FLUSH_INTERVAL': 0})
+created = time.perf_counter()
+client = app.test_client()
+firsts = []
+for url in ('/', '/post/1'):
+    before = time.perf_counter()
+    assert client.get(url).status_code == 200, url
+    firsts.append(time.perf_counter() - before)
+done = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_requests': sum(firsts),
+    'total': done - started,
+}))
+'''
+
+
+def prepare_db(db_path):
+    env = dict(os.environ, DB_URI=f'sqlite:///{db_path}',
+               SECRET_KEY='bench', WARMUP_ON_START='0',
+               JINJA_BYTECODE_CACHE_DIR='')
+    setup = (
+        'from app import create_app\n'
+        'from models import Post, User, db\n'
+        'app = create_app()\n'
+        'with app.app_context():\n'
+        '    db.create_all()\n'
+        '    user = User(username="Bench User", email="bench@example.com")\n'
+        '    user.set_password("benchpassword")\n'
+        '    db.session.add(Post(title="Bench", subtitle="Sub",\n'
+        '                        body="<p>Body</p>", author=user))\n'
+        '    db.session.commit()\n'
+    )
+    subprocess.run([sys.executable, '-c', setup], cwd=ROOT, env=env,
+                   check=True, capture_output=True)
+
+
+def run_child(db_path, cache_dir, warm_up):
+    env = dict(os.environ, DB_URI=f'sqlite:///{db_path}',
+               SECRET_KEY='bench',
+               WARMUP_ON_START='1' if warm_up else '0',
+               JINJA_BYTECODE_CACHE_DIR=cache_dir)
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT,
+                            env=env, check=True, capture_output=True,
+                            text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.db'
+        prepare_db(db_path)
+
+        results = {'lazy': [], 'warm-up, cold cache': [],
+                   'warm-up, warm cache': []}
+        for run in range(args.runs):
+            cache_dir = str(Path(tmp) / f'jinja-{run}')
+            results['lazy'].append(run_child(db_path, '', False))
+            results['warm-up, cold cache'].append(
+                run_child(db_path, cache_dir, True))
+            results['warm-up, warm cache'].append(
+                run_child(db_path, cache_dir, True))
+
+    columns = ('import', 'create_app', 'first_requests', 'total')
+    print(f'{"scenario":<22}' + ''.join(f'{c:>16}' for c in columns) +
+          '   (median ms)')
+    for name, runs in results.items():
+        print(f'{name:<22}' + ''.join(
+            f'{median(r[c] for r in runs) * 1000:>16.1f}' for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Time purging a spam user with a large comment history.
+
+Seeds a throwaway SQLite file with one spammer who wrote ``--posts``
+posts and ``--comments`` comments spread over other users' posts, then
+deletes them:
+
+* ``per row``: load every comment and ``session.delete`` it, then the
+  posts and the user (what deleting through the ORM amounts to)
+* ``purge_user``: ``services.purge_user``, chunked set-based DELETEs with
+  the database cascading the rest
+
+Usage::
+
+    python benchmarks/bench_purge.py [--comments 100000] [--posts 200]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+
+import services  # noqa: E402
+from app import create_app  # noqa: E402
+from models import Comments, Post, User, db  # noqa: E402
+
+
+def seed(comments, posts):
+    spammer = User(username='Spammer', email='spam@example.com', password='x')
+    host = User(username='Host', email='host@example.com', password='x')
+    db.session.add_all([spammer, host])
+    db.session.flush()
+
+    db.session.execute(Post.__table__.insert(), [
+        {'title': f'{user.username} {n}', 'subtitle': 'Sub', 'body': 'Body',
+         'author_id': user.id}
+        for user in (spammer, host) for n in range(posts)])
+    host_posts = db.session.scalars(
+        select(Post.id).where(Post.author_id == host.id)).all()
+
+    db.session.execute(Comments.__table__.insert(), [
+        {'comment': 'spam', 'comment_html': 'spam', 'user_id': spammer.id,
+         'post_id': host_posts[n % len(host_posts)]}
+        for n in range(comments)])
+    db.session.commit()
+
+    return spammer.id
+
+
+def per_row(user_id):
+    for comment in db.session.scalars(
+            select(Comments).where(Comments.user_id == user_id)):
+        db.session.delete(comment)
+    for post in db.session.scalars(
+            select(Post).where(Post.author_id == user_id)):
+        db.session.delete(post)
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+
+def bulk(user_id):
+    with services.unit_of_work():
+        services.purge_user(user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=100_000)
+    parser.add_argument('--posts', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"strategy":<14}{"seconds":>10}   '
+          f'({args.comments:,} comments, {args.posts} posts)')
+
+    for name, purge in (('per row', per_row), ('purge_user', bulk)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db',
+                'SECRET_KEY': 'bench',
+                'WARMUP_ON_START': False,
+                'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+            })
+            with app.app_context():
+                db.create_all()
+                user_id = seed(args.comments, args.posts)
+                db.session.remove()
+
+                started = time.perf_counter()
+                purge(user_id)
+                elapsed = time.perf_counter() - started
+
+                assert db.session.scalar(
+                    select(Comments.id).where(Comments.user_id == user_id)
+                ) is None
+                db.session.remove()
+                db.engine.dispose()
+
+        print(f'{name:<14}{elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
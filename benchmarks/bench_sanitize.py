@@ -0,0 +1,85 @@
+"""Compare HTML sanitization throughput.
+
+Runs ``flask_ckeditor.utils.cleanify`` (a new bleach Cleaner per call)
+against ``sanitize.Sanitizer`` cold (cache cleared before every call) and
+warm (memoized) on typical and pathological inputs.
+
+Usage::
+
+    python benchmarks/bench_sanitize.py [--repeat 5] [--number 200]
+"""
+import argparse
+import sys
+from pathlib import Path
+from timeit import repeat
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask_ckeditor.utils import cleanify  # noqa: E402
+
+from sanitize import Sanitizer  # noqa: E402
+
+TYPICAL = (
+    '<h2>A day in the life</h2>'
+    '<p>Some <strong>bold</strong> and <em>italic</em> text with a '
+    '<a href="https://example.com" title="ex">link</a>.</p>'
+    '<ul><li>one</li><li>two</li><li>three</li></ul>'
+    '<blockquote>quoted <code>code()</code></blockquote>'
+) * 2
+
+PLAIN = 'Nice post, thanks for sharing! ' * 10
+
+NESTED = '<div><span><b><i>' * 500 + 'deep' + '</i></b></span></div>' * 500
+
+HUGE = (
+    '<p onclick="steal()">para <script>alert(1)</script>'
+    '<a href="javascript:void(0)">bad</a> <img src=x onerror=y></p>'
+) * 2000
+
+INPUTS = {
+    'typical': TYPICAL,
+    'plain text': PLAIN,
+    'deeply nested': NESTED,
+    'huge': HUGE,
+}
+
+
+def bench(func, text, repeat_count, number):
+    best = min(repeat(lambda: func(text), repeat=repeat_count,
+                      number=number))
+    return number / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    sanitizer = Sanitizer()
+
+    def cold(text):
+        sanitizer._cache.clear()
+        return sanitizer.clean(text)
+
+    candidates = {
+        'cleanify': cleanify,
+        'Sanitizer cold': cold,
+        'Sanitizer warm': sanitizer.clean,
+    }
+
+    print(f'{"input":<15}{"size":>10}' +
+          ''.join(f'{name:>18}' for name in candidates) + '   (calls/s)')
+
+    for label, text in INPUTS.items():
+        # pathological inputs are slow per call, keep the run short
+        number = args.number if len(text) < 10_000 else max(
+            1, args.number // 50)
+        rates = [bench(func, text, args.repeat, number)
+                 for func in candidates.values()]
+        print(f'{label:<15}{len(text):>10}' +
+              ''.join(f'{rate:>18,.0f}' for rate in rates))
+
+
+if __name__ == '__main__':
+    main()
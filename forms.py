@@ -14,6 +14,8 @@ class CreatePost(FlaskForm):
         'Body', validators=[DataRequired(), Length(max=1000)])
     img_url = StringField(
         'Image URL', validators=[Length(max=500)])
+    tags = StringField(
+        'Tags (comma separated)', validators=[Length(max=250)])
     add = SubmitField('Add Post')
 
 
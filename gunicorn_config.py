@@ -0,0 +1,81 @@
+"""Gunicorn settings, used with ``gunicorn -c gunicorn_config.py``.
+
+The app is imported once in the master (``preload_app``) and forked into
+workers, which share its memory copy-on-write and start faster. Anything
+that must not cross a fork, i.e. pooled DB connections, is reset in
+``post_fork``. Every worker signs sessions with the same ``SECRET_KEY``
+from the environment, so requests may land on any worker or node.
+"""
+import multiprocessing
+from os import environ
+
+bind = f"0.0.0.0:{environ.get('PORT', '8000')}"
+
+# the app is I/O bound (DB, SMTP): a few processes with a few threads each
+# beats many single threaded processes on memory
+workers = int(environ.get(
+    'WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+
+timeout = int(environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# recycle workers now and then to cap slow memory growth
+max_requests = int(environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+
+
+def _flask_app(server):
+    # with preload_app the master already loaded it; this is that object
+    return server.app.wsgi()
+
+
+def when_ready(server):
+    """Close the master's DB connections before any worker is forked.
+
+    create_app primed the pool while preloading; the master never serves
+    requests, so those connections would only sit idle.
+    """
+
+    from models import db
+
+    with _flask_app(server).app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def post_fork(server, worker):
+    """Drop DB connections inherited from the master and warm our own.
+
+    ``close=False`` leaves the parent's sockets alone (closing them here
+    would break the connection for every other process) and just makes
+    this worker open its own. Templates were already compiled in the
+    master and are shared copy-on-write.
+    """
+
+    from models import db
+
+    app = _flask_app(server)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    warmup = app.extensions['warmup']
+    warmup.reset_pool()
+    warmup.run()
+
+
+def worker_exit(server, worker):
+    """Write buffered view counts before the worker goes away."""
+
+    app = _flask_app(server)
+    counter = app.extensions.get('view_counter')
+    if counter is not None:
+        counter.shutdown()
@@ -1,9 +1,10 @@
+import sqlite3
 from datetime import datetime, timezone
 from typing import List
 
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import ForeignKey, String, Text
+from sqlalchemy import Engine, ForeignKey, Index, String, Text, event
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, \
     relationship, WriteOnlyMapped
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -16,26 +17,57 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 
 
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless asked per connection; the
+    # bulk deletes in services.py rely on the database cascading
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 class Post(db.Model):
     __tablename__ = 'Posts'
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(250), unique=True)
     subtitle: Mapped[str] = mapped_column(String(250))
+    # raw editor input; only body_html is ever rendered
     body: Mapped[str] = mapped_column(Text)
+    body_html: Mapped[str | None] = mapped_column(Text)
+    # sanitize.SanitizePolicy.version body_html was produced under
+    sanitize_version: Mapped[str | None] = mapped_column(String(16))
     # timezone utc to ensure uniform timestamps regardless of server location
     date: Mapped[datetime] = mapped_column(
         index=True,
         default=lambda: datetime.now(timezone.utc))  # .strftime('%B %d, %Y')
     img_url: Mapped[str | None] = mapped_column(String(500))
+    # set on add/edit, cleared once related.py recomputes its neighbours
+    related_stale: Mapped[bool] = mapped_column(
+        default=True, server_default='1', index=True)
+    # written in batches by view_counter.ViewCounter, never per request
+    views: Mapped[int] = mapped_column(
+        default=0, server_default='0', index=True)
+    # hidden by a moderator: kept, but out of every public listing
+    hidden: Mapped[bool] = mapped_column(default=False, server_default='0')
     author: Mapped['User'] = relationship(
         back_populates='posts', lazy='joined')
     # foreign key uses tablename
     author_id: Mapped[int] = mapped_column(
-        ForeignKey('user.id', ondelete='CASCADE'))
+        ForeignKey('user.id', ondelete='CASCADE'), index=True)
 
+    # the database deletes comments with their post; never load them
     all_comments: WriteOnlyMapped['Comments'] = relationship(
-        backref='blog_post'
+        backref='blog_post', passive_deletes=True
+    )
+    # written through PostTag so post_date stays in sync; read-only here
+    tags: Mapped[List['Tag']] = relationship(
+        secondary='post_tags', viewonly=True, order_by='Tag.name')
+
+    __table_args__ = (
+        # keyset pagination of monthly archives walks (date, id)
+        Index('ix_Posts_date_id', 'date', 'id'),
     )
 
     def __repr__(self):
@@ -51,10 +83,10 @@ class User(UserMixin, db.Model):
     password: Mapped[str]
 
     posts: Mapped[List['Post']] = relationship(
-        back_populates='author', lazy='dynamic')
+        back_populates='author', lazy='dynamic', passive_deletes=True)
     # same as Mapped[List['Comments]]
     user_comments: WriteOnlyMapped['Comments'] = relationship(
-        backref='the_user'
+        backref='the_user', passive_deletes=True
     )
 
     def __repr__(self):
@@ -72,15 +104,81 @@ class Comments(db.Model):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     comment: Mapped[str] = mapped_column(Text)
+    comment_html: Mapped[str | None] = mapped_column(Text)
+    sanitize_version: Mapped[str | None] = mapped_column(String(16))
+    hidden: Mapped[bool] = mapped_column(default=False, server_default='0')
+    # indexed so cascades and per-user purges do not scan every comment
     user_id: Mapped[int] = mapped_column(
-        ForeignKey('user.id', ondelete='CASCADE'))
+        ForeignKey('user.id', ondelete='CASCADE'), index=True)
 
     # use of backref in child class
     # the_user: Mapped['User'] = relationship(
     #     backref='comments', foreign_keys=[user_id], uselist=False)
 
     post_id: Mapped[str] = mapped_column(
-        ForeignKey('Posts.id', ondelete='CASCADE'))
+        ForeignKey('Posts.id', ondelete='CASCADE'), index=True)
 
     def __repr__(self):
         return f'<comment: {self.comments}>'
+
+
+class RelatedPost(db.Model):
+    """Precomputed top-k neighbours of a post, written by related.py."""
+
+    __tablename__ = 'related_posts'
+
+    # (post_id, rank) primary key makes serving one index range scan
+    post_id: Mapped[int] = mapped_column(
+        ForeignKey('Posts.id', ondelete='CASCADE'), primary_key=True)
+    rank: Mapped[int] = mapped_column(primary_key=True)
+    related_id: Mapped[int] = mapped_column(
+        ForeignKey('Posts.id', ondelete='CASCADE'), index=True)
+    score: Mapped[float]
+
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(50))
+    slug: Mapped[str] = mapped_column(String(50), unique=True)
+
+    def __repr__(self):
+        return f'<tag: {self.slug}>'
+
+
+class PostTag(db.Model):
+    """Post/tag link carrying a copy of the post date.
+
+    The copy lets a tag listing be served from the
+    ``(tag_id, post_date, post_id)`` index alone, newest first, without
+    touching ``Posts`` until the page of ids is known.
+    """
+
+    __tablename__ = 'post_tags'
+
+    post_id: Mapped[int] = mapped_column(
+        ForeignKey('Posts.id', ondelete='CASCADE'), primary_key=True)
+    tag_id: Mapped[int] = mapped_column(
+        ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    post_date: Mapped[datetime]
+
+    __table_args__ = (
+        Index('ix_post_tags_tag_date_post', 'tag_id', 'post_date', 'post_id'),
+    )
+
+
+class ArchiveCount(db.Model):
+    """Denormalized post counts per tag and per month for the sidebar.
+
+    ``kind`` is ``'tag'`` (``key`` = tag slug) or ``'month'`` (``key`` =
+    ``'YYYY-MM'``). Rows are adjusted in the same transaction as the post
+    change, so reading the sidebar never needs a ``GROUP BY``.
+    """
+
+    __tablename__ = 'archive_counts'
+
+    kind: Mapped[str] = mapped_column(String(10), primary_key=True)
+    key: Mapped[str] = mapped_column(String(50), primary_key=True)
+    label: Mapped[str] = mapped_column(String(50))
+    post_count: Mapped[int] = mapped_column(default=0)
@@ -0,0 +1,285 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from flask import Flask, current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+PERIODS: Dict[str, int] = {
+    'second': 1,
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 60 * 60 * 24,
+}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """``amount`` hits allowed per ``period`` seconds."""
+
+    amount: int
+    period: int
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Limit':
+        """Parse a limit string such as ``'5/minute'`` or ``'20/3600'``.
+
+        Raises:
+            ValueError: If ``spec`` is not in ``<amount>/<period>`` form
+        """
+
+        try:
+            amount, period = spec.strip().split('/')
+            amount = int(amount)
+            period = period.strip().lower().rstrip('s')
+            seconds = PERIODS[period] if period in PERIODS else int(period)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f'Invalid rate limit: {spec!r}') from e
+
+        if amount <= 0 or seconds <= 0:
+            raise ValueError(f'Invalid rate limit: {spec!r}')
+
+        return cls(amount, seconds)
+
+
+# algorithms: pure functions over a small per-key state tuple so the same
+# code can run against the in-process backend or a shared store
+
+def token_bucket(state: Optional[tuple], limit: Limit,
+                 now: float) -> Tuple[bool, float, tuple]:
+    """Refill ``limit.amount`` tokens evenly over ``limit.period``.
+
+    Returns:
+        tuple: ``(allowed, retry_after_seconds, new_state)``
+    """
+
+    rate = limit.amount / limit.period
+    tokens, last = state if state else (float(limit.amount), now)
+    tokens = min(float(limit.amount), tokens + (now - last) * rate)
+
+    if tokens >= 1:
+        return True, 0.0, (tokens - 1, now)
+
+    return False, (1 - tokens) / rate, (tokens, now)
+
+
+def sliding_window(state: Optional[tuple], limit: Limit,
+                   now: float) -> Tuple[bool, float, tuple]:
+    """Approximate a sliding window from the current and previous counts.
+
+    Uses constant memory per key: the previous window's count is weighted
+    by how much of it still overlaps the sliding window.
+
+    Returns:
+        tuple: ``(allowed, retry_after_seconds, new_state)``
+    """
+
+    window = int(now // limit.period)
+    current_window, current, previous = state if state else (window, 0, 0)
+
+    if window != current_window:
+        previous = current if window == current_window + 1 else 0
+        current, current_window = 0, window
+
+    elapsed = now - window * limit.period
+    weight = 1 - elapsed / limit.period
+    estimated = previous * weight + current
+
+    if estimated + 1 <= limit.amount:
+        return True, 0.0, (current_window, current + 1, previous)
+
+    return False, limit.period - elapsed, (current_window, current, previous)
+
+
+STRATEGIES: Dict[str, Callable] = {
+    'token-bucket': token_bucket,
+    'sliding-window': sliding_window,
+}
+
+
+class RateLimitBackend(ABC):
+    """Storage interface for limiter state.
+
+    A shared backend (Redis, memcached, a DB table) only has to apply
+    ``algorithm`` to the stored state for ``key`` atomically and persist
+    the new state; the algorithms themselves are backend agnostic.
+    """
+
+    @abstractmethod
+    def hit(self, key: str, limit: Limit,
+            algorithm: Callable) -> Tuple[bool, float]:
+        """Count a hit for ``key``; return ``(allowed, retry_after)``."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget the state of every key."""
+
+
+class MemoryBackend(RateLimitBackend):
+    """Per-process backend with LRU eviction past ``max_keys`` entries."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._states: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def hit(self, key, limit, algorithm):
+        now = time.monotonic()
+        with self._lock:
+            allowed, retry_after, state = algorithm(
+                self._states.get(key), limit, now)
+            self._states[key] = state
+            self._states.move_to_end(key)
+
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+
+        return allowed, retry_after
+
+    def reset(self):
+        with self._lock:
+            self._states.clear()
+
+
+# key functions read only the request and the signed session cookie, so a
+# rejection never costs a DB query or a password hash
+
+def ip_key() -> str:
+    return f'ip:{request.remote_addr}'
+
+
+def user_key() -> Optional[str]:
+    user_id = session.get('_user_id')
+    return f'user:{user_id}' if user_id else None
+
+
+def email_key() -> Optional[str]:
+    email = request.form.get('email')
+    return f'email:{email.strip().lower()}' if email else None
+
+
+# RATELIMIT_* keys that configure the limiter rather than name a limit
+SETTINGS = frozenset(
+    {'RATELIMIT_ENABLED', 'RATELIMIT_STRATEGY', 'RATELIMIT_MAX_KEYS'})
+
+KEY_FUNCS: Dict[str, Callable[[], Optional[str]]] = {
+    'ip': ip_key,
+    'user': user_key,
+    'email': email_key,
+}
+
+
+@dataclass
+class RateLimitState:
+    """What a limiter keeps per app, in ``app.extensions['rate_limiter']``.
+
+    ``limits`` maps each configured spec string to its parsed ``Limit``.
+    """
+
+    limiter: 'RateLimiter'
+    backend: RateLimitBackend
+    limits: Dict[str, Limit] = field(default_factory=dict)
+
+    def limit_for(self, spec: str) -> Limit:
+        limit = self.limits.get(spec)
+        if limit is None:
+            # config changed after init_app, e.g. in tests
+            limit = self.limits[spec] = Limit.parse(spec)
+
+        return limit
+
+
+class RateLimiter:
+    """Named per-route limits configured from ``RATELIMIT_<NAME>``.
+
+    A ``backend`` passed here (e.g. a shared store) is used by every app
+    the limiter is initialised on; without one each app gets its own
+    ``MemoryBackend`` sized by its ``RATELIMIT_MAX_KEYS``.
+
+    Usage::
+
+        @route('/login', methods=['POST', 'GET'])
+        @limiter.limit('login', keys=('ip', 'email'))
+        def login():
+            ...
+    """
+
+    def __init__(self, app: Optional[Flask] = None,
+                 backend: Optional[RateLimitBackend] = None):
+        self.backend = backend
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STRATEGY', 'sliding-window')
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 10000)
+        strategy = app.config['RATELIMIT_STRATEGY']
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown RATELIMIT_STRATEGY {strategy!r}')
+
+        backend = self.backend or MemoryBackend(
+            app.config['RATELIMIT_MAX_KEYS'])
+        state = RateLimitState(self, backend)
+
+        # a typo in RATELIMIT_<NAME> fails here, not on the first request
+        for key, spec in app.config.items():
+            if key.startswith('RATELIMIT_') and key not in SETTINGS and spec:
+                try:
+                    state.limit_for(spec)
+                except ValueError as e:
+                    raise ValueError(f'{key}: {e}') from e
+
+        app.extensions['rate_limiter'] = state
+
+    def check(self, name: str, keys: Sequence[str]) -> None:
+        """Count a hit for every key and abort with 429 if any is over.
+
+        Raises:
+            TooManyRequests: If one of the keys has exhausted its limit
+        """
+
+        config = current_app.config
+        state: RateLimitState = current_app.extensions['rate_limiter']
+        spec = config.get(f'RATELIMIT_{name.upper()}')
+        if not config['RATELIMIT_ENABLED'] or not spec:
+            return
+
+        limit = state.limit_for(spec)
+        algorithm = STRATEGIES[config['RATELIMIT_STRATEGY']]
+
+        for key_name in keys:
+            key = KEY_FUNCS[key_name]()
+            if key is None:
+                continue
+
+            allowed, retry_after = state.backend.hit(
+                f'{name}:{key}', limit, algorithm)
+            if not allowed:
+                current_app.logger.warning(
+                    'Rate limit %s exceeded for %s', name, key)
+                raise TooManyRequests(retry_after=int(retry_after) + 1)
+
+    def limit(self, name: str, keys: Sequence[str] = ('ip',),
+              methods: Sequence[str] = ('POST',)):
+        """Decorator applying limit ``name`` to requests using ``methods``."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if request.method in methods:
+                    self.check(name, keys)
+
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,216 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, select, update
+
+from models import Post, RelatedPost, db
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+
+# short, frequent words that would otherwise make every post look alike
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its of
+on or so that the their then there these this to was were will with you
+your we our not no can do just about""".split())
+
+# rows of the similarity product computed at once, bounds peak memory
+CHUNK_SIZE = 512
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase word tokens of ``text`` with HTML tags and stop words out."""
+
+    if not text:
+        return []
+
+    text = _TAG_RE.sub(' ', text).lower()
+    return [token for token in _TOKEN_RE.findall(text)
+            if token not in STOP_WORDS]
+
+
+def tfidf_matrix(documents: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+    """Build L2-normalised TF-IDF rows for tokenized ``documents``.
+
+    Term frequencies are sublinear (``1 + log(tf)``) and IDF is smoothed
+    (``log((1 + n) / (1 + df)) + 1``), so rows can be compared with a
+    plain dot product.
+    """
+
+    vocabulary: Dict[str, int] = {}
+    indptr = [0]
+    indices: List[int] = []
+    data: List[int] = []
+
+    for tokens in documents:
+        counts: Dict[int, int] = {}
+        for token in tokens:
+            column = vocabulary.setdefault(token, len(vocabulary))
+            counts[column] = counts.get(column, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64),
+         np.asarray(indices, dtype=np.int64),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=(len(documents), max(len(vocabulary), 1)))
+
+    matrix.data = 1.0 + np.log(matrix.data)
+
+    n_docs = matrix.shape[0]
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1.0
+
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def top_neighbours(matrix: sparse.csr_matrix, rows: Sequence[int],
+                   k: int) -> Dict[int, List[Tuple[int, float]]]:
+    """Return the ``k`` most similar other rows for each of ``rows``.
+
+    Cosine similarity of normalised rows is a sparse product; it is done
+    in chunks of ``CHUNK_SIZE`` rows so memory stays bounded on large
+    corpora. Zero-similarity neighbours are dropped.
+    """
+
+    neighbours: Dict[int, List[Tuple[int, float]]] = {}
+    transposed = matrix.T.tocsc()
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = np.asarray(rows[start:start + CHUNK_SIZE])
+        sims = (matrix[chunk] @ transposed).toarray()
+        sims[np.arange(len(chunk)), chunk] = -1.0
+
+        count = min(k, sims.shape[1] - 1)
+        if count <= 0:
+            neighbours.update((int(row), []) for row in chunk)
+            continue
+
+        best = np.argpartition(-sims, count - 1, axis=1)[:, :count]
+        for offset, row in enumerate(chunk):
+            candidates = best[offset]
+            scores = sims[offset, candidates]
+            order = np.argsort(-scores, kind='stable')
+            neighbours[int(row)] = [
+                (int(candidates[i]), float(scores[i]))
+                for i in order if scores[i] > 0
+            ]
+
+    return neighbours
+
+
+def _load_corpus() -> Tuple[List[int], sparse.csr_matrix]:
+    rows = db.session.execute(
+        select(Post.id, Post.title, Post.subtitle, Post.body)
+        .where(Post.hidden.is_(False))
+        .order_by(Post.id)
+    ).all()
+
+    post_ids = [row.id for row in rows]
+    documents = [
+        tokenize(row.title) + tokenize(row.subtitle) + tokenize(row.body)
+        for row in rows
+    ]
+
+    return post_ids, tfidf_matrix(documents)
+
+
+def _store(post_ids: List[int],
+           neighbours: Dict[int, List[Tuple[int, float]]]) -> None:
+    sources = [post_ids[row] for row in neighbours]
+
+    db.session.execute(
+        delete(RelatedPost).where(RelatedPost.post_id.in_(sources)))
+
+    values = [
+        {'post_id': post_ids[row], 'rank': rank,
+         'related_id': post_ids[col], 'score': score}
+        for row, found in neighbours.items()
+        for rank, (col, score) in enumerate(found)
+    ]
+    if values:
+        db.session.execute(RelatedPost.__table__.insert(), values)
+
+    db.session.execute(
+        update(Post).where(Post.id.in_(sources))
+        .values(related_stale=False)
+        .execution_options(synchronize_session=False))
+
+
+def _affected_rows(matrix: sparse.csr_matrix, post_ids: List[int],
+                   stale_ids: Iterable[int], k: int) -> Set[int]:
+    """Rows whose neighbour list may change because ``stale_ids`` did.
+
+    That is the stale posts themselves, posts that already list one of
+    them, and posts for which a stale post now beats the weakest stored
+    neighbour (or whose list is not yet full).
+    """
+
+    position = {post_id: row for row, post_id in enumerate(post_ids)}
+    stale_rows = [position[post_id] for post_id in stale_ids
+                  if post_id in position]
+    affected: Set[int] = set(stale_rows)
+    if not stale_rows:
+        return affected
+
+    stored = db.session.execute(
+        select(RelatedPost.post_id, RelatedPost.related_id,
+               RelatedPost.score)
+    ).all()
+
+    weakest = np.zeros(len(post_ids))
+    filled = np.zeros(len(post_ids), dtype=np.int64)
+    stale_set = set(stale_ids)
+    for row in stored:
+        source = position.get(row.post_id)
+        if source is None:
+            continue
+        if row.related_id in stale_set:
+            affected.add(source)
+        filled[source] += 1
+        weakest[source] = row.score if filled[source] == 1 else min(
+            weakest[source], row.score)
+
+    sims = (matrix @ matrix[stale_rows].T).toarray().max(axis=1)
+    beats = (sims > 0) & ((filled < k) | (sims > weakest))
+    affected.update(int(row) for row in np.flatnonzero(beats))
+
+    return affected
+
+
+def recompute_related(k: int, full: bool = False) -> int:
+    """Refresh the ``related_posts`` table.
+
+    Args:
+        k (int): Neighbours kept per post
+        full (bool): Recompute every post instead of only stale ones
+
+    Returns:
+        int: Number of posts whose neighbour lists were rewritten
+    """
+
+    post_ids, matrix = _load_corpus()
+    if not post_ids:
+        return 0
+
+    if full:
+        rows = list(range(len(post_ids)))
+    else:
+        stale_ids = db.session.scalars(
+            select(Post.id).where(Post.related_stale.is_(True))).all()
+        rows = sorted(_affected_rows(matrix, post_ids, stale_ids, k))
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        _store(post_ids, top_neighbours(matrix, chunk, k))
+    db.session.commit()
+
+    return len(rows)
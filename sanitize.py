@@ -0,0 +1,147 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import Dict, FrozenSet, Optional
+
+from bleach.sanitizer import Cleaner
+from flask import Flask
+
+# same tags flask_ckeditor.utils.cleanify allows by default
+DEFAULT_TAGS: FrozenSet[str] = frozenset({
+    'a', 'abbr', 'b', 'blockquote', 'code', 'em', 'i', 'li', 'ol', 'pre',
+    'strong', 'ul', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p'})
+DEFAULT_ATTRIBUTES: Dict[str, FrozenSet[str]] = {
+    'a': frozenset({'href', 'title'}),
+    'abbr': frozenset({'title'}),
+}
+DEFAULT_PROTOCOLS: FrozenSet[str] = frozenset({'http', 'https', 'mailto'})
+
+# characters bleach would rewrite; text without them passes through as-is
+_MARKUP_CHARS = ('<', '>', '&')
+
+
+@dataclass(frozen=True)
+class SanitizePolicy:
+    """Allow-list applied to user supplied HTML.
+
+    ``version`` is derived from the allow-list itself, so editing the
+    policy marks every stored sanitized copy as stale without a manual
+    version bump.
+    """
+
+    tags: FrozenSet[str] = DEFAULT_TAGS
+    attributes: Dict[str, FrozenSet[str]] = field(
+        default_factory=lambda: dict(DEFAULT_ATTRIBUTES))
+    protocols: FrozenSet[str] = DEFAULT_PROTOCOLS
+
+    @property
+    def version(self) -> str:
+        spec = repr((
+            sorted(self.tags),
+            sorted((tag, sorted(attrs))
+                   for tag, attrs in self.attributes.items()),
+            sorted(self.protocols),
+        ))
+        return sha256(spec.encode('utf-8')).hexdigest()[:16]
+
+    def __hash__(self):
+        return hash(self.version)
+
+
+class Sanitizer:
+    """Policy-driven HTML cleaner memoized by content hash.
+
+    ``bleach`` ``Cleaner`` objects are built once per policy and thread
+    instead of once per call, plain text skips parsing entirely, and
+    results are kept in an LRU cache keyed by the SHA-256 of the input so
+    re-sanitizing the same body (edits that leave it unchanged, policy
+    refreshes, duplicate comments) costs a dictionary lookup.
+    """
+
+    def __init__(self, app: Optional[Flask] = None,
+                 policy: Optional[SanitizePolicy] = None,
+                 max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[bytes, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.set_policy(policy or SanitizePolicy())
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Apply the app's ``SANITIZE_ALLOWED_TAGS`` and cache size.
+
+        Only the tag allow-list is configurable; allowed attributes and
+        URL protocols are always ``DEFAULT_ATTRIBUTES`` and
+        ``DEFAULT_PROTOCOLS``. An empty list means ``DEFAULT_TAGS``.
+        """
+
+        app.config.setdefault('SANITIZE_ALLOWED_TAGS', None)
+        app.config.setdefault('SANITIZE_CACHE_SIZE', self.max_entries)
+        app.extensions['sanitizer'] = self
+
+        self.max_entries = app.config['SANITIZE_CACHE_SIZE']
+        # always reset: the module-level sanitizer may have been set up
+        # by an earlier app with a different allow-list
+        tags = app.config['SANITIZE_ALLOWED_TAGS']
+        self.set_policy(SanitizePolicy(tags=frozenset(tags))
+                        if tags else SanitizePolicy())
+
+    def set_policy(self, policy: SanitizePolicy) -> None:
+        """Switch allow-lists; cached output of the old policy is dropped."""
+
+        with self._lock:
+            self.policy = policy
+            self.version = policy.version
+            self._cache.clear()
+
+    def _cleaner(self) -> Cleaner:
+        # bleach Cleaners are not thread safe, so keep one per thread and
+        # rebuild it only when the policy changes
+        local = self._local
+        if getattr(local, 'version', None) != self.version:
+            policy = self.policy
+            local.cleaner = Cleaner(
+                tags=policy.tags,
+                attributes={tag: list(attrs)
+                            for tag, attrs in policy.attributes.items()},
+                protocols=policy.protocols,
+            )
+            local.version = self.version
+
+        return local.cleaner
+
+    def clean(self, html: Optional[str]) -> str:
+        """Return ``html`` reduced to the current allow-list."""
+
+        if not html:
+            return ''
+        if not any(char in html for char in _MARKUP_CHARS):
+            return html
+
+        key = sha256(html.encode('utf-8')).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        cleaned = self._cleaner().clean(html)
+
+        with self._lock:
+            self._cache[key] = cleaned
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return cleaned
+
+    def is_stale(self, stored_version: Optional[str]) -> bool:
+        """Whether HTML stored under ``stored_version`` needs re-cleaning."""
+
+        return stored_version != self.version
+
+
+sanitizer = Sanitizer()
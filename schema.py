@@ -0,0 +1,68 @@
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+import services
+from models import ArchiveCount, db
+
+
+def upgrade_schema() -> List[str]:
+    """Bring an existing database up to the current models.
+
+    ``db.create_all()`` only creates missing tables, so databases created
+    before columns such as ``Posts.views`` or ``comments.hidden`` existed
+    fail on the first query. This adds, without touching existing data:
+
+    * missing tables (with their indexes),
+    * missing columns, using their server defaults for existing rows,
+    * missing indexes on existing tables,
+
+    and fills ``archive_counts`` when that table is new. Running it again
+    is a no-op.
+
+    Returns:
+        List[str]: Description of every change made
+    """
+
+    engine = db.engine
+    quote = engine.dialect.identifier_preparer.format_table
+    changes: List[str] = []
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing = set(inspector.get_table_names())
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing:
+                table.create(conn)
+                changes.append(f'created table {table.name}')
+                continue
+
+            columns = {column['name']
+                       for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(
+                        f'{table.name}.{column.name} is NOT NULL without a '
+                        'server default; add it by hand')
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {quote(table)} ADD COLUMN {ddl}')
+                changes.append(f'added column {table.name}.{column.name}')
+
+            indexes = {index['name']
+                       for index in inspect(conn).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    changes.append(f'created index {index.name}')
+
+    if f'created table {ArchiveCount.__tablename__}' in changes:
+        with services.unit_of_work():
+            services.rebuild_archive_counts()
+        changes.append(f'filled {ArchiveCount.__tablename__}')
+
+    return changes
@@ -0,0 +1,582 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import (Dict, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple, Union)
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload
+
+from models import (ArchiveCount, Comments, Post, PostTag, RelatedPost, Tag,
+                    User, db)
+from sanitize import sanitizer
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Session]:
+    """Commit everything done inside the block in one transaction.
+
+    Any exception rolls the whole unit back and is re-raised so the route
+    can decide what to flash. Objects stay in the identity map after the
+    commit, so the caller never needs to re-read what it just wrote.
+    """
+
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def find_user_by_email(email: Optional[str]) -> Optional[User]:
+    """Return the user registered with ``email``, without a query if empty."""
+
+    if not email:
+        return None
+
+    return db.session.scalar(select(User).where(User.email == email))
+
+
+def register_user(username: str, email: str, password: str) -> User:
+    """Stage a new user with a hashed password."""
+
+    user = User(username=username, email=email)
+    user.set_password(password)
+    db.session.add(user)
+
+    return user
+
+
+def latest_posts(limit: int) -> Sequence[Post]:
+    """Return the ``limit`` newest posts with their authors."""
+
+    return db.session.scalars(
+        select(Post).where(Post.hidden.is_(False))
+        .order_by(Post.date.desc()).limit(limit)).all()
+
+
+def post_comments(post_id: int) -> Sequence[Comments]:
+    """Return a post's comments with their authors loaded in one query."""
+
+    return db.session.scalars(
+        select(Comments)
+        .options(joinedload(Comments.the_user))
+        .where(Comments.post_id == post_id, Comments.hidden.is_(False))
+    ).all()
+
+
+def _sanitize_post(post: Post) -> None:
+    post.body_html = sanitizer.clean(post.body)
+    post.sanitize_version = sanitizer.version
+
+
+def _sanitize_comment(comment: Comments) -> None:
+    comment.comment_html = sanitizer.clean(comment.comment)
+    comment.sanitize_version = sanitizer.version
+
+
+def stale_sanitized(post: Post, comments: Sequence[Comments]
+                    ) -> List[Union[Post, Comments]]:
+    """Return the rows whose stored HTML predates the current policy."""
+
+    stale: List[Union[Post, Comments]] = []
+    if sanitizer.is_stale(post.sanitize_version):
+        stale.append(post)
+    stale.extend(comment for comment in comments
+                 if sanitizer.is_stale(comment.sanitize_version))
+
+    return stale
+
+
+def resanitize(rows: Sequence[Union[Post, Comments]]) -> None:
+    """Re-clean the raw HTML of ``rows`` under the current policy."""
+
+    for row in rows:
+        if isinstance(row, Post):
+            _sanitize_post(row)
+        else:
+            _sanitize_comment(row)
+
+
+def add_comment(post: Post, user: User, comment: str) -> Comments:
+    """Stage a comment by ``user`` on ``post`` with its sanitized HTML."""
+
+    user_comment = Comments(
+        comment=comment,
+        the_user=user,
+        blog_post=post
+    )
+    _sanitize_comment(user_comment)
+    db.session.add(user_comment)
+
+    return user_comment
+
+
+def create_post(author: User, title: str, subtitle: str, body: str,
+                img_url: str, tags: Optional[str] = None) -> Post:
+    """Stage a new post keeping the raw body and its sanitized HTML.
+
+    Its month and tag counters are bumped in the same transaction.
+    """
+
+    post = Post(
+        title=title,
+        subtitle=subtitle,
+        body=body,
+        img_url=img_url,
+        author=author,
+        # set now rather than at flush so tags and counters can use it
+        date=datetime.now(timezone.utc)
+    )
+    _sanitize_post(post)
+    db.session.add(post)
+
+    _bump_month(post.date, 1)
+    set_post_tags(post, tags)
+
+    return post
+
+
+def update_post(post: Post, title: str, subtitle: str, body: str,
+                img_url: str, tags: Optional[str] = None) -> Post:
+    """Apply edits to an already loaded post.
+
+    Changes go through the identity map, so the flush only UPDATEs the
+    columns that actually changed and the loaded object stays current.
+    """
+
+    # before the edits below, so loading the current tags does not
+    # autoflush a half-applied update
+    set_post_tags(post, tags)
+
+    if (title, subtitle, body) != (post.title, post.subtitle, post.body):
+        post.related_stale = True
+
+    post.title = title
+    post.subtitle = subtitle
+    post.img_url = img_url
+    if body != post.body or sanitizer.is_stale(post.sanitize_version):
+        post.body = body
+        _sanitize_post(post)
+
+    return post
+
+
+def delete_post(post: Post) -> None:
+    """Stage deletion of a loaded post; see :func:`delete_posts`."""
+
+    delete_posts([post.id])
+
+
+def related_posts(post_id: int) -> Sequence:
+    """Return ``(id, title)`` of the precomputed neighbours of a post."""
+
+    return db.session.execute(
+        select(Post.id, Post.title)
+        .join(RelatedPost, RelatedPost.related_id == Post.id)
+        .where(RelatedPost.post_id == post_id)
+        .order_by(RelatedPost.rank)
+    ).all()
+
+
+# tags and archives
+
+def parse_tags(raw: Optional[str]) -> Dict[str, str]:
+    """Map slug to display name for a comma separated tag string."""
+
+    tags: Dict[str, str] = {}
+    for name in (raw or '').split(','):
+        name = ' '.join(name.split())[:50]
+        slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')[:50]
+        if slug:
+            tags.setdefault(slug, name)
+
+    return tags
+
+
+def _bump_count(kind: str, key: str, label: str, delta: int) -> None:
+    # one upsert per counter keeps concurrent writers from racing on the
+    # first insert of a new tag or month
+    table = ArchiveCount.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        db.session.execute(
+            insert(table)
+            .values(kind=kind, key=key, label=label,
+                    post_count=max(delta, 0))
+            .on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.key],
+                set_={'post_count': table.c.post_count + delta}))
+        return
+
+    result = db.session.execute(
+        update(table)
+        .where(table.c.kind == kind, table.c.key == key)
+        .values(post_count=table.c.post_count + delta))
+    if not result.rowcount:
+        db.session.execute(table.insert().values(
+            kind=kind, key=key, label=label, post_count=max(delta, 0)))
+
+
+def _bump_month(date: datetime, delta: int) -> None:
+    _bump_count('month', f'{date:%Y-%m}', f'{date:%B %Y}', delta)
+
+
+def set_post_tags(post: Post, raw: Optional[str]) -> None:
+    """Make ``post``'s tags match ``raw`` and adjust the tag counters.
+
+    Tags that do not exist yet are created. ``None`` removes every tag.
+    Hidden posts are not counted, so their counters are left alone;
+    :func:`hide_posts` counts them again when they are unhidden.
+    """
+
+    wanted = parse_tags(raw)
+    counted = not post.hidden
+    current = {tag.slug: tag for tag in post.tags} if post.id else {}
+
+    removed = [current[slug] for slug in current.keys() - wanted.keys()]
+    added = [slug for slug in wanted if slug not in current]
+    if not removed and not added:
+        return
+
+    if removed:
+        db.session.execute(
+            delete(PostTag).where(
+                PostTag.post_id == post.id,
+                PostTag.tag_id.in_([tag.id for tag in removed])))
+        for tag in removed if counted else ():
+            _bump_count('tag', tag.slug, tag.name, -1)
+
+    if added:
+        existing = {tag.slug: tag for tag in db.session.scalars(
+            select(Tag).where(Tag.slug.in_(added)))}
+        new_tags = [Tag(slug=slug, name=wanted[slug])
+                    for slug in added if slug not in existing]
+        db.session.add_all(new_tags)
+        # ids of the post and any new tag are needed for the links
+        db.session.flush()
+
+        for tag in [*existing.values(), *new_tags]:
+            db.session.add(PostTag(post_id=post.id, tag_id=tag.id,
+                                   post_date=post.date))
+            if counted:
+                _bump_count('tag', tag.slug, tag.name, 1)
+
+    db.session.expire(post, ['tags'])
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Parse a ``<iso date>_<id>`` keyset cursor; ``None`` if malformed."""
+
+    if not cursor:
+        return None
+
+    date, _, post_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(date), int(post_id)
+    except ValueError:
+        return None
+
+
+def encode_cursor(date: datetime, post_id: int) -> str:
+    return f'{date.isoformat()}_{post_id}'
+
+
+def _keyset_page(stmt, date_col, id_col, cursor: Optional[str],
+                 per_page: int) -> Tuple[List[Post], Optional[str]]:
+    after = decode_cursor(cursor)
+    if after:
+        stmt = stmt.where(tuple_(date_col, id_col) < tuple_(*after))
+
+    posts = list(db.session.scalars(
+        stmt.order_by(date_col.desc(), id_col.desc()).limit(per_page + 1)))
+
+    next_cursor = None
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        next_cursor = encode_cursor(posts[-1].date, posts[-1].id)
+
+    return posts, next_cursor
+
+
+def tag_page(slug: str, cursor: Optional[str], per_page: int
+             ) -> Tuple[Optional[Tag], List[Post], Optional[str]]:
+    """Return a tag, one page of its posts (newest first) and next cursor.
+
+    Seeks on the ``(tag_id, post_date, post_id)`` index instead of using
+    an OFFSET, so deep pages cost the same as the first.
+    """
+
+    tag = db.session.scalar(select(Tag).where(Tag.slug == slug))
+    if tag is None:
+        return None, [], None
+
+    stmt = (select(Post)
+            .join(PostTag, PostTag.post_id == Post.id)
+            .where(PostTag.tag_id == tag.id, Post.hidden.is_(False)))
+    posts, next_cursor = _keyset_page(
+        stmt, PostTag.post_date, PostTag.post_id, cursor, per_page)
+
+    return tag, posts, next_cursor
+
+
+def month_page(year: int, month: int, cursor: Optional[str], per_page: int
+               ) -> Tuple[List[Post], Optional[str]]:
+    """Return one page of a month's posts (newest first) and next cursor."""
+
+    stmt = select(Post).where(Post.date >= datetime(year, month, 1),
+                              Post.hidden.is_(False))
+    # December 9999 has no next month datetime can represent
+    if (year, month) < (datetime.max.year, 12):
+        stmt = stmt.where(
+            Post.date < datetime(year + month // 12, month % 12 + 1, 1))
+
+    return _keyset_page(stmt, Post.date, Post.id, cursor, per_page)
+
+
+def archive_sidebar() -> Tuple[List[ArchiveCount], List[ArchiveCount]]:
+    """Return ``(tags, months)`` with posts, read from the counter table."""
+
+    rows = db.session.scalars(
+        select(ArchiveCount).where(ArchiveCount.post_count > 0)).all()
+
+    tags = sorted((row for row in rows if row.kind == 'tag'),
+                  key=lambda row: row.label.lower())
+    months = sorted((row for row in rows if row.kind == 'month'),
+                    key=lambda row: row.key, reverse=True)
+
+    return tags, months
+
+
+def rebuild_archive_counts() -> int:
+    """Recount every tag and month from scratch.
+
+    Only for backfilling or repairing the table; the request handlers
+    keep it current incrementally.
+
+    Returns:
+        int: Number of counter rows written
+    """
+
+    months: Counter = Counter()
+    labels: Dict[str, str] = {}
+    for date in db.session.scalars(
+            select(Post.date).where(Post.hidden.is_(False))):
+        key = f'{date:%Y-%m}'
+        months[key] += 1
+        labels[key] = f'{date:%B %Y}'
+
+    tag_counts = db.session.execute(
+        select(Tag.slug, Tag.name, func.count(PostTag.post_id))
+        .join(PostTag, PostTag.tag_id == Tag.id)
+        .join(Post, Post.id == PostTag.post_id)
+        .where(Post.hidden.is_(False))
+        .group_by(Tag.id, Tag.slug, Tag.name)
+    ).all()
+
+    values = [
+        {'kind': 'month', 'key': key, 'label': labels[key],
+         'post_count': count}
+        for key, count in months.items()
+    ] + [
+        {'kind': 'tag', 'key': slug, 'label': name, 'post_count': count}
+        for slug, name, count in tag_counts
+    ]
+
+    db.session.execute(delete(ArchiveCount))
+    if values:
+        db.session.execute(ArchiveCount.__table__.insert(), values)
+
+    return len(values)
+
+
+# moderation
+
+# ids per IN (...) list; stays under SQLite's bound-parameter limit and
+# keeps every statement's locks and undo log small
+DELETE_CHUNK_SIZE = 500
+
+
+def _chunks(ids: Iterable[int]) -> Iterator[List[int]]:
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        yield ids[start:start + DELETE_CHUNK_SIZE]
+
+
+def _adjust_archive_counts(post_ids: List[int], delta: int) -> None:
+    # one aggregate per chunk, then one upsert per distinct month or tag
+    months: Counter = Counter()
+    labels: Dict[str, str] = {}
+    for date in db.session.scalars(
+            select(Post.date).where(Post.id.in_(post_ids))):
+        key = f'{date:%Y-%m}'
+        months[key] += 1
+        labels[key] = f'{date:%B %Y}'
+
+    tag_counts = db.session.execute(
+        select(Tag.slug, Tag.name, func.count(PostTag.post_id))
+        .join(PostTag, PostTag.tag_id == Tag.id)
+        .where(PostTag.post_id.in_(post_ids))
+        .group_by(Tag.id, Tag.slug, Tag.name)
+    ).all()
+
+    for key, count in months.items():
+        _bump_count('month', key, labels[key], delta * count)
+    for slug, name, count in tag_counts:
+        _bump_count('tag', slug, name, delta * count)
+
+
+def _unlist_posts(post_ids: List[int]) -> None:
+    """Take visible posts out of the archive counters and neighbour lists.
+
+    Posts that listed one of them as related are flagged for the next
+    ``flask related-posts`` run.
+    """
+
+    if not post_ids:
+        return
+
+    _adjust_archive_counts(post_ids, -1)
+    db.session.execute(
+        update(Post)
+        .where(Post.id.in_(select(RelatedPost.post_id)
+                           .where(RelatedPost.related_id.in_(post_ids))))
+        .values(related_stale=True)
+        .execution_options(synchronize_session=False))
+    db.session.execute(
+        delete(RelatedPost).where(RelatedPost.post_id.in_(post_ids) |
+                                  RelatedPost.related_id.in_(post_ids)))
+
+
+def delete_posts(post_ids: Iterable[int]) -> int:
+    """Delete posts with set-based statements, a chunk of ids at a time.
+
+    Counters and neighbour lists are adjusted per chunk; the database
+    cascades to comments, tag links and related-posts rows.
+
+    Returns:
+        int: Number of posts deleted
+    """
+
+    deleted = 0
+    for chunk in _chunks(post_ids):
+        # hidden posts were already unlisted when they were hidden
+        _unlist_posts(db.session.scalars(
+            select(Post.id)
+            .where(Post.id.in_(chunk), Post.hidden.is_(False))).all())
+        deleted += db.session.execute(
+            delete(Post).where(Post.id.in_(chunk))).rowcount
+
+    return deleted
+
+
+def hide_posts(post_ids: Iterable[int], hidden: bool = True) -> int:
+    """Hide posts from, or return them to, every public listing.
+
+    Returns:
+        int: Number of posts whose visibility changed
+    """
+
+    changed = 0
+    for chunk in _chunks(post_ids):
+        changing = db.session.scalars(
+            select(Post.id)
+            .where(Post.id.in_(chunk), Post.hidden.is_(not hidden))).all()
+        if not changing:
+            continue
+
+        if hidden:
+            _unlist_posts(changing)
+            values = {'hidden': True}
+        else:
+            _adjust_archive_counts(changing, 1)
+            values = {'hidden': False, 'related_stale': True}
+
+        db.session.execute(
+            update(Post).where(Post.id.in_(changing)).values(**values))
+        changed += len(changing)
+
+    return changed
+
+
+def delete_comments(comment_ids: Iterable[int]) -> int:
+    """Delete comments by id, a chunk per statement.
+
+    Returns:
+        int: Number of comments deleted
+    """
+
+    return sum(
+        db.session.execute(
+            delete(Comments).where(Comments.id.in_(chunk))).rowcount
+        for chunk in _chunks(comment_ids))
+
+
+def hide_comments(comment_ids: Iterable[int], hidden: bool = True) -> int:
+    """Hide comments from, or return them to, their post's page.
+
+    Returns:
+        int: Number of comments updated
+    """
+
+    return sum(
+        db.session.execute(
+            update(Comments).where(Comments.id.in_(chunk))
+            .values(hidden=hidden)).rowcount
+        for chunk in _chunks(comment_ids))
+
+
+def purge_user(user_id: int) -> Dict[str, int]:
+    """Delete a user together with every post and comment they wrote.
+
+    Their comments are deleted a chunk at a time by a subquery on the
+    ``user_id`` index, so ids never travel to the app and no statement
+    grows with the user's history; their posts go through
+    :func:`delete_posts`. The user row itself is deleted last.
+
+    Returns:
+        dict: Rows deleted, keyed ``users``, ``posts`` and ``comments``
+    """
+
+    posts = delete_posts(db.session.scalars(
+        select(Post.id).where(Post.author_id == user_id)).all())
+
+    comments = 0
+    while True:
+        chunk = (select(Comments.id)
+                 .where(Comments.user_id == user_id)
+                 .limit(DELETE_CHUNK_SIZE)
+                 .scalar_subquery())
+        deleted = db.session.execute(
+            delete(Comments).where(Comments.id.in_(chunk))
+            .execution_options(synchronize_session=False)).rowcount
+        comments += deleted
+        if deleted < DELETE_CHUNK_SIZE:
+            break
+
+    users = db.session.execute(
+        delete(User).where(User.id == user_id)).rowcount
+
+    return {'users': users, 'posts': posts, 'comments': comments}
+
+
+def moderation_queue(limit: int) -> Tuple[Sequence[Comments], Sequence[Post]]:
+    """Return the newest comments and posts, hidden ones included."""
+
+    comments = db.session.scalars(
+        select(Comments)
+        .options(joinedload(Comments.the_user))
+        .order_by(Comments.id.desc())
+        .limit(limit)
+    ).all()
+    posts = db.session.scalars(
+        select(Post).order_by(Post.date.desc(), Post.id.desc()).limit(limit)
+    ).all()
+
+    return comments, posts
@@ -1,19 +1,27 @@
 import pytest
+from flask import g
 
-from app import app as flask_app
+from app import create_app
+from models import User
 from models import db as models_db
 
 
 @pytest.fixture(scope='session')
 def app():
-    flask_app.config.update({
+    flask_app = create_app({
         'TESTING': True,
+        'SECRET_KEY': 'test-secret-key',
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'WTF_CSRF_ENABLED': False,
+        # flush view counts explicitly instead of from a background thread
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+        # tests that exercise limits turn it back on
+        'RATELIMIT_ENABLED': False,
     })
     with flask_app.app_context():
         models_db.create_all()
         yield flask_app
+        flask_app.extensions['view_counter'].flush()
         models_db.session.remove()
         models_db.drop_all()
 
@@ -26,3 +34,22 @@ def client(app):
 @pytest.fixture
 def runner(app):
     return app.test_cli_runner()
+
+
+@pytest.fixture
+def admin_login(client, app):
+    """Log ``client`` in as the admin, i.e. user 1."""
+
+    if models_db.session.get(User, 1) is None:
+        admin = User(id=1, username='Admin', email='admin@example.com')
+        admin.set_password('adminpassword')
+        models_db.session.add(admin)
+        models_db.session.commit()
+
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    # the app context is shared, forget whoever was loaded before and after
+    g.pop('_login_user', None)
+    yield
+    g.pop('_login_user', None)
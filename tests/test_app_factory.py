@@ -0,0 +1,105 @@
+import re
+
+import pytest
+
+from app import create_app
+from models import User
+from models import db as models_db
+
+
+def make_worker(db_uri, secret_key, fallbacks=()):
+    return create_app({
+        'TESTING': True,
+        'SECRET_KEY': secret_key,
+        'SECRET_KEY_FALLBACKS': list(fallbacks),
+        'SQLALCHEMY_DATABASE_URI': db_uri,
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+        'RATELIMIT_ENABLED': False,
+    })
+
+
+@pytest.fixture
+def db_uri(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'workers.db'}"
+    setup = make_worker(uri, 'setup-key')
+    with setup.app_context():
+        models_db.create_all()
+        user = User(username='Worker Hopper', email='hopper@example.com')
+        user.set_password('hopperpassword')
+        models_db.session.add(user)
+        models_db.session.commit()
+
+    return uri
+
+
+def csrf_token(response):
+    return re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"',
+                     response.data).group(1).decode()
+
+
+def login_on(worker):
+    client = worker.test_client()
+    token = csrf_token(client.get('/login'))
+    response = client.post('/login', data={
+        'csrf_token': token,
+        'email': 'hopper@example.com',
+        'password': 'hopperpassword',
+    })
+    assert response.status_code == 302
+
+    return client.get_cookie('session').value
+
+
+def hop_to(worker, session_cookie):
+    client = worker.test_client()
+    client.set_cookie('session', session_cookie)
+
+    return client
+
+
+def test_session_and_csrf_survive_worker_hop(db_uri):
+    worker_a = make_worker(db_uri, 'shared-key')
+    worker_b = make_worker(db_uri, 'shared-key')
+
+    client = hop_to(worker_b, login_on(worker_a))
+    response = client.get('/add-post')
+    assert response.status_code == 200
+
+    # a form rendered by worker B is accepted by worker A
+    token = csrf_token(response)
+    client = hop_to(worker_a, client.get_cookie('session').value)
+    response = client.post('/add-post', data={
+        'csrf_token': token, 'title': 'Hopped Post',
+        'subtitle': 'Sub', 'body': 'Body'})
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/'
+
+
+def test_per_worker_keys_lose_the_session(db_uri):
+    worker_a = make_worker(db_uri, 'key-a')
+    worker_b = make_worker(db_uri, 'key-b')
+
+    client = hop_to(worker_b, login_on(worker_a))
+    response = client.get('/add-post')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_rotated_key_still_accepts_old_sessions(db_uri):
+    old_worker = make_worker(db_uri, 'old-key')
+    new_worker = make_worker(db_uri, 'new-key', fallbacks=['old-key'])
+
+    client = hop_to(new_worker, login_on(old_worker))
+    assert client.get('/add-post').status_code == 200
+
+
+def test_explicit_secret_key_skips_env_fallback(db_uri, monkeypatch, caplog):
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+
+    app = make_worker(db_uri, 'configured-key')
+    assert app.config['SECRET_KEY'] == 'configured-key'
+    assert 'SECRET_KEY is not set' not in caplog.text
+
+    app = make_worker(db_uri, None)
+    assert len(app.config['SECRET_KEY']) == 64
+    assert 'SECRET_KEY is not set' in caplog.text
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import services
+from models import ArchiveCount, Post, PostTag, User
+from models import db as models_db
+
+
+def counts(kind):
+    return {row.key: row.post_count for row in models_db.session.scalars(
+        models_db.select(ArchiveCount).where(ArchiveCount.kind == kind))}
+
+
+def make_author(email):
+    user = User(username='Archive Author', email=email)
+    user.set_password('archivepassword')
+    models_db.session.add(user)
+
+    return user
+
+
+def test_parse_tags_normalises_and_dedupes():
+    assert services.parse_tags(' Flask , python,,flask, Web  Dev') == {
+        'flask': 'Flask', 'python': 'python', 'web-dev': 'Web Dev'}
+
+
+def test_counters_follow_add_and_edit(app):
+    with services.unit_of_work():
+        author = make_author('counts@example.com')
+        post = services.create_post(author, 'Counted Tags', 'Sub', 'Body',
+                                    '', tags='Alpha, Beta')
+    assert counts('month')[f'{post.date:%Y-%m}'] >= 1
+    assert counts('tag')['alpha'] == 1
+    assert counts('tag')['beta'] == 1
+
+    with services.unit_of_work():
+        services.update_post(post, 'Counted Tags', 'Sub', 'Body', '',
+                             tags='beta, Gamma')
+
+    tags = counts('tag')
+    assert (tags['alpha'], tags['beta'], tags['gamma']) == (0, 1, 1)
+    assert [tag.slug for tag in post.tags] == ['beta', 'gamma']
+
+
+def test_rebuild_matches_incremental_counts(app):
+    with services.unit_of_work():
+        author = make_author('rebuild@example.com')
+        services.create_post(author, 'Rebuild Me', 'Sub', 'Body', '',
+                             tags='Rebuild')
+    before = (counts('tag'), counts('month'))
+
+    with services.unit_of_work():
+        services.rebuild_archive_counts()
+
+    after_tags, after_months = counts('tag'), counts('month')
+    assert {k: v for k, v in before[0].items() if v} == after_tags
+    assert before[1] == after_months
+
+
+def test_tag_pages_use_keyset_cursor(client, app):
+    with services.unit_of_work():
+        author = make_author('keyset@example.com')
+        for number in range(20):
+            post = services.create_post(author, f'Keyset {number:02}', 'Sub',
+                                        'Body', '', tags='Paged')
+            post.date = datetime(2020, 1, 1 + number)
+            models_db.session.flush()
+            models_db.session.execute(
+                models_db.update(PostTag).where(PostTag.post_id == post.id)
+                .values(post_date=post.date))
+
+    first = client.get('/tag/paged')
+    assert first.status_code == 200
+    assert b'Keyset 19' in first.data and b'Keyset 05' in first.data
+    assert b'Keyset 04' not in first.data
+
+    page, next_cursor = services.tag_page('paged', None, 15)[1:]
+    assert [p.title for p in page][-1] == 'Keyset 05'
+    assert next_cursor.startswith('2020-01-06')
+
+    rest = services.tag_page('paged', next_cursor, 15)[1]
+    assert [p.title for p in rest] == [f'Keyset {n:02}' for n in
+                                       range(4, -1, -1)]
+    assert next_cursor in first.data.decode().replace('%3A', ':')
+
+    assert client.get('/tag/missing').status_code == 302
+
+
+def test_month_page_and_sidebar(client, app):
+    with services.unit_of_work():
+        author = make_author('month@example.com')
+        post = services.create_post(author, 'Leap Day', 'Sub', 'Body', '')
+        post.date = datetime(2024, 2, 29, 12)
+
+    posts, _ = services.month_page(2024, 2, None, 15)
+    assert [p.title for p in posts] == ['Leap Day']
+    assert services.month_page(2024, 3, None, 15)[0] == []
+
+    assert client.get('/archive/2024/2').status_code == 200
+    assert client.get('/archive/2024/13').status_code == 404
+    assert client.get('/archive/9999/12').status_code == 200
+    assert client.get('/archive/10000/1').status_code == 404
+
+    response = client.get('/all-blogs')
+    assert b'Archives' in response.data
+    assert b'/tag/' in response.data
+    assert models_db.session.get(Post, post.id) is not None
@@ -0,0 +1,211 @@
+from flask import g
+from sqlalchemy import event, func
+
+import services
+from models import ArchiveCount, Comments, Post, PostTag, RelatedPost, User
+from models import db as models_db
+
+
+def make_user(email):
+    user = User(username='Moderated User', email=email)
+    user.set_password('moderatedpassword')
+    models_db.session.add(user)
+
+    return user
+
+
+def add_comments(post, user, count):
+    models_db.session.flush()
+    models_db.session.execute(Comments.__table__.insert(), [
+        {'comment': f'spam {n}', 'comment_html': f'spam {n}',
+         'user_id': user.id, 'post_id': post.id} for n in range(count)])
+
+
+def count_rows(model, *where):
+    return models_db.session.scalar(
+        models_db.select(func.count()).select_from(model).where(*where))
+
+
+def tag_count(slug):
+    return models_db.session.scalar(
+        models_db.select(ArchiveCount.post_count)
+        .where(ArchiveCount.kind == 'tag', ArchiveCount.key == slug))
+
+
+def test_delete_posts_cascades_and_uncounts(app):
+    with services.unit_of_work():
+        author = make_user('bulk-delete@example.com')
+        doomed = [services.create_post(author, f'Doomed {n}', 'Sub', 'Body',
+                                       '', tags='Doomed') for n in range(3)]
+        keeper = services.create_post(author, 'Keeper', 'Sub', 'Body', '')
+        models_db.session.flush()
+        add_comments(doomed[0], author, 5)
+        models_db.session.add(RelatedPost(post_id=keeper.id, rank=0,
+                                          related_id=doomed[0].id, score=.5))
+        keeper.related_stale = False
+    doomed_ids = [post.id for post in doomed]
+
+    with services.unit_of_work():
+        assert services.delete_posts(doomed_ids) == 3
+
+    assert count_rows(Post, Post.id.in_(doomed_ids)) == 0
+    assert count_rows(Comments, Comments.post_id == doomed_ids[0]) == 0
+    assert count_rows(PostTag, PostTag.post_id.in_(doomed_ids)) == 0
+    assert count_rows(RelatedPost, RelatedPost.post_id == keeper.id) == 0
+    assert tag_count('doomed') == 0
+    assert models_db.session.get(Post, keeper.id).related_stale is True
+
+
+def test_hidden_posts_leave_public_listings(client, app):
+    with services.unit_of_work():
+        author = make_user('hidden-post@example.com')
+        post = services.create_post(author, 'Hidden Gem', 'Sub', 'Body', '',
+                                    tags='Secret')
+
+    with services.unit_of_work():
+        assert services.hide_posts([post.id]) == 1
+        # already hidden, nothing changes
+        assert services.hide_posts([post.id]) == 0
+
+    assert tag_count('secret') == 0
+    assert post not in services.latest_posts(50)
+    g.pop('_login_user', None)
+    assert client.get(f'/post/{post.id}').status_code == 302
+
+    with services.unit_of_work():
+        assert services.hide_posts([post.id], hidden=False) == 1
+
+    assert tag_count('secret') == 1
+    assert post.related_stale is True
+    assert client.get(f'/post/{post.id}').status_code == 200
+
+
+def test_editing_hidden_post_keeps_tag_counts(app):
+    with services.unit_of_work():
+        author = make_user('hidden-edit@example.com')
+        post = services.create_post(author, 'Hidden Edit', 'Sub', 'Body', '',
+                                    tags='Drift Alpha')
+
+    with services.unit_of_work():
+        services.hide_posts([post.id])
+    with services.unit_of_work():
+        services.update_post(post, 'Hidden Edit', 'Sub', 'Body', '',
+                             tags='Drift Alpha, Drift Beta')
+    assert tag_count('drift-beta') is None
+
+    with services.unit_of_work():
+        services.hide_posts([post.id], hidden=False)
+    assert (tag_count('drift-alpha'), tag_count('drift-beta')) == (1, 1)
+
+    with services.unit_of_work():
+        services.delete_posts([post.id])
+    assert (tag_count('drift-alpha'), tag_count('drift-beta')) == (0, 0)
+
+
+def test_comment_moderation(app):
+    with services.unit_of_work():
+        author = make_user('comments-mod@example.com')
+        post = services.create_post(author, 'Commented', 'Sub', 'Body', '')
+        add_comments(post, author, 4)
+    ids = models_db.session.scalars(
+        models_db.select(Comments.id).where(Comments.post_id == post.id)
+    ).all()
+
+    with services.unit_of_work():
+        assert services.hide_comments(ids[:2]) == 2
+    assert len(services.post_comments(post.id)) == 2
+
+    with services.unit_of_work():
+        assert services.delete_comments(ids[1:]) == 3
+    assert count_rows(Comments, Comments.post_id == post.id) == 1
+
+
+def test_purge_user_deletes_in_bounded_chunks(app, monkeypatch):
+    monkeypatch.setattr(services, 'DELETE_CHUNK_SIZE', 50)
+    with services.unit_of_work():
+        spammer = make_user('spammer@example.com')
+        bystander = make_user('bystander@example.com')
+        spam_post = services.create_post(spammer, 'Spam Post', 'Sub', 'Body',
+                                         '', tags='Spam')
+        other_post = services.create_post(bystander, 'Innocent', 'Sub',
+                                          'Body', '')
+        add_comments(other_post, spammer, 220)
+        add_comments(spam_post, bystander, 3)
+    spammer_id, spam_post_id = spammer.id, spam_post.id
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(models_db.engine, 'before_cursor_execute',
+                 before_cursor_execute)
+    try:
+        with services.unit_of_work():
+            purged = services.purge_user(spammer_id)
+    finally:
+        event.remove(models_db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+    assert purged == {'users': 1, 'posts': 1, 'comments': 220}
+    # 220 comments in five chunks of 50, not one statement per row
+    assert sum(s.startswith('DELETE FROM comments') for s in statements) == 5
+    assert count_rows(User, User.id == spammer_id) == 0
+    assert count_rows(Comments, Comments.user_id == spammer_id) == 0
+    # the bystander's comments went with the spam post
+    assert count_rows(Comments, Comments.post_id == spam_post_id) == 0
+    assert count_rows(Comments, Comments.post_id == other_post.id) == 0
+    assert tag_count('spam') == 0
+
+
+def test_moderation_routes(client, app, admin_login):
+    with services.unit_of_work():
+        author = make_user('route-mod@example.com')
+        post = services.create_post(author, 'Moderated Post', 'Sub', 'Body',
+                                    '')
+        add_comments(post, author, 2)
+    comment_ids = models_db.session.scalars(
+        models_db.select(Comments.id).where(Comments.post_id == post.id)
+    ).all()
+    author_id, post_id = author.id, post.id
+
+    response = client.post('/admin/moderation', data={
+        'kind': 'comments', 'action': 'hide', 'ids': comment_ids})
+    assert response.status_code == 302
+    assert services.post_comments(post_id) == []
+
+    page = client.get('/admin/moderation')
+    assert page.status_code == 200
+    assert b'Moderated Post' in page.data and b'hidden' in page.data
+
+    assert client.post('/admin/purge-user/1').status_code == 302
+    assert count_rows(User, User.id == 1) == 1
+
+    assert client.post(f'/admin/purge-user/{author_id}').status_code == 302
+    assert count_rows(User, User.id == author_id) == 0
+    assert count_rows(Post, Post.id == post_id) == 0
+
+
+def test_delete_post_route_uses_cascades(client, app, admin_login):
+    with services.unit_of_work():
+        author = make_user('route-delete@example.com')
+        post = services.create_post(author, 'Route Delete', 'Sub', 'Body', '')
+        add_comments(post, author, 3)
+    post_id = post.id
+
+    assert client.get(f'/delete-post/{post_id}').status_code == 302
+    assert count_rows(Post, Post.id == post_id) == 0
+    assert count_rows(Comments, Comments.post_id == post_id) == 0
+
+
+def test_moderation_page_escapes_usernames(client, app, admin_login):
+    with services.unit_of_work():
+        author = make_user('xss@example.com')
+        author.username = "x');alert(document.cookie);('"
+        services.create_post(author, 'Scripted Name', 'Sub', 'Body', '')
+
+    page = client.get('/admin/moderation').data.decode()
+
+    assert 'onclick' not in page
+    assert 'data-confirm="Delete x&#39;);alert(document.cookie);(&#39; ' \
+        'and everything they wrote?"' in page
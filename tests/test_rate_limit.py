@@ -0,0 +1,168 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app import create_app
+from models import User
+from models import db as models_db
+from rate_limit import (Limit, MemoryBackend, RateLimitBackend,
+                        sliding_window, token_bucket)
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    # the shared test app runs with rate limiting off
+    monkeypatch.setitem(app.config, 'RATELIMIT_ENABLED', True)
+    state = app.extensions['rate_limiter']
+    state.backend.reset()
+    yield state
+    state.backend.reset()
+
+
+def test_limit_parse():
+    assert Limit.parse('5/minute') == Limit(5, 60)
+    assert Limit.parse('2/hours') == Limit(2, 3600)
+    assert Limit.parse('3/30') == Limit(3, 30)
+
+    with pytest.raises(ValueError):
+        Limit.parse('many/minute')
+
+
+@pytest.mark.parametrize('algorithm', [token_bucket, sliding_window])
+def test_algorithms_block_then_recover(algorithm):
+    limit = Limit(3, 60)
+    state, now = None, 6000.0
+
+    for _ in range(3):
+        allowed, _, state = algorithm(state, limit, now)
+        assert allowed is True
+
+    allowed, retry_after, state = algorithm(state, limit, now)
+    assert allowed is False
+    assert retry_after > 0
+
+    allowed, _, state = algorithm(state, limit, now + 120)
+    assert allowed is True
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=2)
+    limit = Limit(1, 60)
+
+    backend.hit('a', limit, token_bucket)
+    backend.hit('b', limit, token_bucket)
+    backend.hit('a', limit, token_bucket)
+    backend.hit('c', limit, token_bucket)
+
+    assert len(backend) == 2
+    # 'b' was evicted, so it starts over with a full bucket
+    assert backend.hit('b', limit, token_bucket)[0] is True
+    assert backend.hit('c', limit, token_bucket)[0] is False
+
+
+def test_incomplete_backend_fails_when_built():
+    class HitOnly(RateLimitBackend):
+        def hit(self, key, limit, algorithm):
+            return True, 0.0
+
+    with pytest.raises(TypeError):
+        HitOnly()
+
+
+def test_login_rejected_before_password_check(client, app, limiter,
+                                              monkeypatch):
+    checked = []
+    monkeypatch.setattr('models.User.check_password',
+                        lambda self, pw: checked.append(pw) or False)
+    monkeypatch.setitem(app.config, 'RATELIMIT_LOGIN', '2/minute')
+
+    with app.app_context():
+        user = User(username='Limited', email='limited@example.com')
+        user.set_password('limitedpassword')
+        models_db.session.add(user)
+        models_db.session.commit()
+
+    data = MultiDict({'email': 'limited@example.com',
+                      'password': 'wrong', 'login': 'Sign In'})
+    statuses = [client.post('/login', data=data).status_code
+                for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    assert len(checked) == 2
+
+
+def test_get_requests_are_not_limited(client, app, limiter, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATELIMIT_LOGIN', '1/minute')
+
+    for _ in range(3):
+        assert client.get('/login').status_code == 200
+
+
+def test_clients_behind_proxy_get_their_own_bucket(client, app, limiter,
+                                                   monkeypatch):
+    monkeypatch.setitem(app.config, 'RATELIMIT_LOGIN', '1/minute')
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+
+    def login(forwarded_for, email):
+        return client.post('/login', data={
+            'email': email, 'password': 'wrong', 'login': 'Sign In'},
+            headers={'X-Forwarded-For': forwarded_for}).status_code
+
+    assert login('203.0.113.1', 'one@example.com') == 200
+    assert login('203.0.113.2', 'two@example.com') == 200
+    assert login('203.0.113.1', 'three@example.com') == 429
+
+
+def test_proxy_fix_hops_come_from_config(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'proxy-key',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'proxy.db'}",
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+        'WARMUP_ON_START': False,
+        'PROXY_FIX_HOPS': 2,
+    })
+
+    assert isinstance(app.wsgi_app, ProxyFix)
+    assert app.wsgi_app.x_for == 2
+
+
+def test_each_app_gets_its_own_backend(app, tmp_path):
+    other = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'other-key',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}",
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+        'WARMUP_ON_START': False,
+        'RATELIMIT_MAX_KEYS': 7,
+    })
+
+    ours = app.extensions['rate_limiter'].backend
+    theirs = other.extensions['rate_limiter'].backend
+    assert theirs is not ours
+    assert (theirs.max_keys, ours.max_keys) == (7, 10000)
+
+
+def test_bad_limit_spec_fails_at_startup(tmp_path):
+    with pytest.raises(ValueError, match='RATELIMIT_LOGIN'):
+        create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'typo-key',
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'typo.db'}",
+            'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+            'WARMUP_ON_START': False,
+            'RATELIMIT_LOGIN': '10/minit',
+        })
+
+
+def test_limits_are_parsed_once(app, limiter, monkeypatch):
+    assert limiter.limits[app.config['RATELIMIT_LOGIN']] == Limit(10, 60)
+
+    parsed = []
+    monkeypatch.setattr(Limit, 'parse',
+                        classmethod(lambda cls, spec: parsed.append(spec)))
+    with app.test_request_context('/login', method='POST'):
+        for _ in range(2):
+            limiter.limiter.check('login', keys=('ip',))
+
+    assert parsed == []
@@ -0,0 +1,60 @@
+import numpy as np
+
+from models import Post, RelatedPost, User
+from models import db as models_db
+from related import recompute_related, tfidf_matrix, tokenize, top_neighbours
+
+
+def test_tokenize_strips_html_and_stop_words():
+    assert tokenize('<p>The <b>Flask</b> app</p>') == ['flask', 'app']
+
+
+def test_top_neighbours_orders_by_cosine_similarity():
+    matrix = tfidf_matrix([
+        ['flask', 'python', 'web'],
+        ['flask', 'python', 'orm'],
+        ['cooking', 'pasta'],
+        ['flask', 'web'],
+    ])
+
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1))
+    assert np.allclose(norms, 1.0)
+
+    neighbours = top_neighbours(matrix, [0, 2], k=2)
+    assert [row for row, _ in neighbours[0]] == [3, 1]
+    # nothing shares a term with the cooking post
+    assert neighbours[2] == []
+
+
+def test_incremental_recompute_and_serving(client, app, runner):
+    with app.app_context():
+        user = User(username='Related Author', email='related@example.com')
+        user.set_password('relatedpassword')
+        posts = [
+            Post(title='Gardening tomatoes', subtitle='Soil and sun',
+                 body='tomatoes need sun soil water', author=user),
+            Post(title='Growing tomatoes', subtitle='More sun',
+                 body='tomatoes love sun and soil', author=user),
+            Post(title='Baking sourdough', subtitle='Starter',
+                 body='flour water starter bread', author=user),
+        ]
+        models_db.session.add_all(posts)
+        models_db.session.commit()
+        first, second, _ = [post.id for post in posts]
+
+    result = runner.invoke(args=['related-posts', '--full'])
+    assert 'Recomputed related posts' in result.output
+
+    related_ids = models_db.session.scalars(
+        models_db.select(RelatedPost.related_id)
+        .where(RelatedPost.post_id == first)
+        .order_by(RelatedPost.rank)).all()
+    assert related_ids[0] == second
+    assert models_db.session.get(Post, first).related_stale is False
+
+    # nothing changed, so an incremental run has no work
+    assert recompute_related(3) == 0
+
+    response = client.get(f'/post/{first}')
+    assert b'Related Posts' in response.data
+    assert b'Growing tomatoes' in response.data
@@ -1,20 +1,28 @@
+from contextlib import contextmanager
+
+from flask import g
+from sqlalchemy import event
 from werkzeug.datastructures import MultiDict
 
 from models import Post, User
 from models import db as models_db
 
 
-def create_user_and_post(app):
+def create_user_and_post(app, suffix=''):
     with app.app_context():
-        user = User(username='RouteTester', email='route@example.com')
+        user = User(username='RouteTester',
+                    email=f'route{suffix}@example.com')
         user.set_password('securepassword')
         models_db.session.add(user)
         models_db.session.commit()
 
-        post = Post(title='Route Post', subtitle='Route Subtitle',
+        post = Post(title=f'Route Post {suffix}'.strip(),
+                    subtitle='Route Subtitle',
                     body='Route Body', author=user)
         models_db.session.add(post)
         models_db.session.commit()
+        # load attributes so they outlive the context
+        models_db.session.refresh(post)
 
         return user, post
 
@@ -58,3 +66,129 @@ def test_register_and_login_flow(client, app):
 
     # after successful login, should reach a page (200) or redirect -> 200
     assert res2.status_code == 200
+
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements sent to the DB inside the block."""
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # the test app context is shared by every request, so drop the identity
+    # map and the cached login to measure each route like a fresh request
+    models_db.session.remove()
+    g.pop('_login_user', None)
+    event.listen(models_db.engine, 'before_cursor_execute',
+                 before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(models_db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+
+def login_as(client, app, email):
+    with app.app_context():
+        user = User(username='Query Counter', email=email)
+        user.set_password('countingpassword')
+        models_db.session.add(user)
+        models_db.session.commit()
+
+    # forget whoever an earlier test logged in on the shared app context
+    g.pop('_login_user', None)
+    client.post('/login', data={'email': email,
+                                'password': 'countingpassword'})
+
+
+def test_login_get_runs_no_queries(client):
+    with count_queries() as statements:
+        response = client.get('/login')
+
+    assert response.status_code == 200
+    assert statements == []
+
+
+def test_login_post_runs_one_query(client, app):
+    with app.app_context():
+        user = User(username='Single Query', email='single@example.com')
+        user.set_password('singlepassword')
+        models_db.session.add(user)
+        models_db.session.commit()
+
+    with count_queries() as statements:
+        response = client.post('/login', data={
+            'email': 'single@example.com', 'password': 'singlepassword'})
+
+    assert response.status_code == 302
+    assert len(statements) == 1
+
+
+def test_home_query_count(client, app):
+    create_user_and_post(app, 'home')
+    app.extensions['view_counter'].top_posts()
+
+    with count_queries() as statements:
+        response = client.get('/')
+
+    assert response.status_code == 200
+    # admin lookup + newest three posts with authors joined
+    assert len(statements) == 2
+    assert 'LIMIT' in statements[-1]
+
+
+def test_show_post_query_count(client, app):
+    _, post = create_user_and_post(app, 'show')
+    # first view stores the sanitized body of the fixture post
+    client.get(f'/post/{post.id}')
+
+    with count_queries() as statements:
+        response = client.get(f'/post/{post.id}')
+
+    assert response.status_code == 200
+    # admin lookup + post with author + comments with their users +
+    # precomputed related posts + tags
+    assert len(statements) == 5
+
+
+def test_add_post_does_not_reread(client, app):
+    login_as(client, app, 'adder@example.com')
+
+    with count_queries() as statements:
+        response = client.post('/add-post', data={
+            'title': 'Counted Post', 'subtitle': 'Sub', 'body': 'Body'})
+
+    assert response.status_code == 302
+    # session user + INSERT + month counter upsert, nothing read back
+    assert len(statements) == 3
+    assert statements[-1].startswith('INSERT')
+
+
+def test_edit_post_updates_through_identity_map(client, app, admin_login):
+    _, post = create_user_and_post(app, 'edit')
+
+    with count_queries() as statements:
+        response = client.post(f'/edit-post/{post.id}', data={
+            'title': 'Edited Post', 'subtitle': 'Edited', 'body': 'Body',
+            'img_url': ''})
+
+    assert response.status_code == 302
+    # session user (the admin check reuses it) + post + its tags, then
+    # one UPDATE
+    assert len(statements) == 4
+    assert statements[-1].startswith('UPDATE')
+
+
+def test_admin_routes_reject_other_users(client, app):
+    victim, post = create_user_and_post(app, 'forbidden')
+    login_as(client, app, 'not-admin@example.com')
+
+    assert client.get(f'/edit-post/{post.id}').status_code == 403
+    assert client.get(f'/delete-post/{post.id}').status_code == 403
+    assert client.get('/admin/moderation').status_code == 403
+    assert client.post(f'/admin/purge-user/{victim.id}').status_code == 403
+    assert models_db.session.get(Post, post.id) is not None
+    assert models_db.session.get(User, victim.id) is not None
+    g.pop('_login_user', None)
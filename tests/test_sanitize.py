@@ -0,0 +1,86 @@
+from app import create_app
+from models import Post, User
+from models import db as models_db
+from sanitize import SanitizePolicy, Sanitizer, sanitizer
+
+
+def test_clean_strips_disallowed_markup():
+    cleaner = Sanitizer()
+    cleaned = cleaner.clean(
+        '<p onclick="x()">Hi <script>alert(1)</script>'
+        '<a href="javascript:alert(1)">link</a></p>')
+
+    assert 'onclick' not in cleaned
+    assert '<script>' not in cleaned
+    assert 'javascript:' not in cleaned
+    assert cleaned.startswith('<p>Hi ')
+
+
+def test_clean_memoizes_and_skips_plain_text(monkeypatch):
+    cleaner = Sanitizer()
+    calls = []
+    real = cleaner._cleaner
+
+    def counting_cleaner():
+        calls.append(1)
+        return real()
+
+    monkeypatch.setattr(cleaner, '_cleaner', counting_cleaner)
+
+    assert cleaner.clean('just text') == 'just text'
+    cleaner.clean('<b>bold</b>')
+    cleaner.clean('<b>bold</b>')
+
+    assert len(calls) == 1
+
+
+def test_policy_change_bumps_version_and_clears_cache():
+    cleaner = Sanitizer()
+    before = cleaner.version
+    assert cleaner.clean('<h1>Title</h1>') == '<h1>Title</h1>'
+
+    cleaner.set_policy(SanitizePolicy(tags=frozenset({'p'})))
+
+    assert cleaner.version != before
+    assert cleaner.is_stale(before)
+    assert cleaner.clean('<h1>Title</h1>') == '&lt;h1&gt;Title&lt;/h1&gt;'
+
+
+def test_show_post_resanitizes_stale_rows_once(client, app):
+    with app.app_context():
+        user = User(username='Stale Author', email='stale@example.com')
+        user.set_password('stalepassword')
+        post = Post(title='Stale Post', subtitle='Sub',
+                    body='<p>Raw <script>x</script></p>', author=user)
+        models_db.session.add(post)
+        models_db.session.commit()
+        post_id = post.id
+
+    response = client.get(f'/post/{post_id}')
+    assert b'<script>x' not in response.data
+
+    stored = models_db.session.get(Post, post_id)
+    assert stored.body == '<p>Raw <script>x</script></p>'
+    assert stored.body_html == '<p>Raw &lt;script&gt;x&lt;/script&gt;</p>'
+    assert stored.sanitize_version == sanitizer.version
+
+
+def test_later_app_without_tags_gets_default_policy(tmp_path):
+    def build(**overrides):
+        return create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'policy-key',
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'p.db'}",
+            'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+            'WARMUP_ON_START': False,
+            **overrides,
+        })
+
+    try:
+        build(SANITIZE_ALLOWED_TAGS=['b'])
+        assert sanitizer.policy.tags == frozenset({'b'})
+
+        build(SANITIZE_ALLOWED_TAGS=[])
+        assert sanitizer.version == SanitizePolicy().version
+    finally:
+        sanitizer.set_policy(SanitizePolicy())
@@ -0,0 +1,74 @@
+from sqlalchemy import create_engine, inspect
+
+from app import create_app
+from models import ArchiveCount, Post
+from models import db as models_db
+
+# the tables as created before views, sanitized HTML, related posts,
+# tags and moderation were added
+OLD_SCHEMA = [
+    '''CREATE TABLE user (
+        id INTEGER PRIMARY KEY, username VARCHAR(250) NOT NULL,
+        email VARCHAR NOT NULL UNIQUE, password VARCHAR NOT NULL)''',
+    '''CREATE TABLE "Posts" (
+        id INTEGER PRIMARY KEY, title VARCHAR(250) NOT NULL UNIQUE,
+        subtitle VARCHAR(250) NOT NULL, body TEXT NOT NULL,
+        date DATETIME NOT NULL, img_url VARCHAR(500),
+        author_id INTEGER NOT NULL
+            REFERENCES user (id) ON DELETE CASCADE)''',
+    'CREATE INDEX "ix_Posts_date" ON "Posts" (date)',
+    '''CREATE TABLE comments (
+        id INTEGER PRIMARY KEY, comment TEXT NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES user (id) ON DELETE CASCADE,
+        post_id INTEGER NOT NULL REFERENCES "Posts" (id) ON DELETE CASCADE)''',
+    "INSERT INTO user VALUES (1, 'Old Admin', 'old@example.com', 'x')",
+    '''INSERT INTO "Posts" VALUES (1, 'Old Post', 'Sub', '<p>Old body</p>',
+        '2023-05-04 10:00:00', NULL, 1)''',
+    "INSERT INTO comments VALUES (1, 'Old comment', 1, 1)",
+]
+
+
+def test_upgrade_db_brings_old_database_up_to_date(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'old.db'}"
+    with create_engine(uri).begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.exec_driver_sql(statement)
+
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'upgrade-key',
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+        'WARMUP_ON_START': False,
+    })
+    runner = app.test_cli_runner()
+
+    # the CLI reuses an already pushed app context, so push this app's
+    with app.app_context():
+        result = runner.invoke(args=['upgrade-db'])
+    assert result.exit_code == 0, result.output
+    assert 'added column Posts.views' in result.output
+    assert 'added column comments.hidden' in result.output
+    assert 'created table post_tags' in result.output
+    assert 'created index ix_comments_user_id' in result.output
+
+    with app.app_context():
+        post = models_db.session.get(Post, 1)
+        assert (post.views, post.hidden, post.related_stale) == (0, False,
+                                                                 True)
+        counts = models_db.session.scalars(models_db.select(ArchiveCount))
+        assert [(c.key, c.post_count) for c in counts] == [('2023-05', 1)]
+        assert 'ix_Posts_date_id' in {
+            index['name']
+            for index in inspect(models_db.engine).get_indexes('Posts')}
+
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    response = client.get('/post/1')
+    assert response.status_code == 200
+    assert b'Old body' in response.data and b'Old comment' in response.data
+
+    with app.app_context():
+        again = runner.invoke(args=['upgrade-db'])
+    assert again.exit_code == 0
+    assert '(0 change(s))' in again.output
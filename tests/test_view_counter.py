@@ -0,0 +1,85 @@
+import pytest
+
+from models import Post, User
+from models import db as models_db
+from view_counter import ViewCounter
+
+
+def create_post(app, title):
+    with app.app_context():
+        user = User(username='Counter Tester',
+                    email=f'{title.lower().replace(" ", ".")}@example.com')
+        user.set_password('counterpassword')
+        post = Post(title=title, subtitle='Sub', body='Body', author=user)
+        models_db.session.add(post)
+        models_db.session.commit()
+
+        return post.id
+
+
+@pytest.fixture
+def counter(app, monkeypatch):
+    # keep the app's own counter registered once the test is over
+    monkeypatch.setitem(app.extensions, 'view_counter',
+                        app.extensions['view_counter'])
+    return ViewCounter(app)
+
+
+def test_increments_are_buffered_until_flush(app, counter):
+    post_id = create_post(app, 'Buffered Post')
+
+    for _ in range(5):
+        counter.incr(post_id)
+
+    assert counter.pending(post_id) == 5
+    assert models_db.session.get(Post, post_id).views == 0
+
+    assert counter.flush() == 1
+    models_db.session.expire_all()
+    assert models_db.session.get(Post, post_id).views == 5
+    assert counter.pending(post_id) == 0
+
+
+def test_threshold_triggers_flush_and_refreshes_top(app, counter):
+    app.config['VIEW_COUNTER_FLUSH_THRESHOLD'] = 3
+    try:
+        post_id = create_post(app, 'Threshold Post')
+        for _ in range(3):
+            counter.incr(post_id, amount=10)
+    finally:
+        app.config['VIEW_COUNTER_FLUSH_THRESHOLD'] = 500
+
+    assert counter.pending(post_id) == 0
+    assert counter.top_posts()[0][0] == post_id
+
+
+def test_top_list_expires_without_local_flushes(app, counter, monkeypatch):
+    post_id = create_post(app, 'Other Worker Post')
+    monkeypatch.setitem(app.config, 'VIEW_COUNTER_FLUSH_INTERVAL', 30)
+    clock = [1000.0]
+    monkeypatch.setattr('view_counter.time.monotonic', lambda: clock[0])
+
+    counter.top_posts()
+    # another worker flushes views this one never recorded
+    with models_db.engine.begin() as conn:
+        conn.execute(models_db.update(Post).where(Post.id == post_id)
+                     .values(views=10 ** 6))
+
+    clock[0] += 29
+    assert counter.top_posts()[0][2] < 10 ** 6
+    clock[0] += 1
+    assert counter.top_posts()[0] == (post_id, 'Other Worker Post', 10 ** 6)
+
+
+def test_show_post_counts_views(client, app):
+    post_id = create_post(app, 'Viewed Post')
+    counter = app.extensions['view_counter']
+
+    client.get(f'/post/{post_id}')
+    client.get(f'/post/{post_id}')
+
+    assert counter.pending(post_id) == 2
+    counter.flush()
+
+    response = client.get('/')
+    assert b'Most Read' in response.data
@@ -0,0 +1,60 @@
+from app import create_app
+
+
+def make_app(tmp_path, **overrides):
+    config = {
+        'TESTING': True,
+        'SECRET_KEY': 'warmup-key',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'warm.db'}",
+        'JINJA_BYTECODE_CACHE_DIR': str(tmp_path / 'jinja'),
+        'VIEW_COUNTER_FLUSH_INTERVAL': 0,
+    }
+    config.update(overrides)
+
+    return create_app(config)
+
+
+def test_startup_compiles_templates_into_shared_cache(tmp_path):
+    app = make_app(tmp_path)
+    warmup = app.extensions['warmup']
+
+    assert warmup.ready is True
+    assert warmup.templates_loaded >= 8
+    assert len(app.jinja_env.cache) >= warmup.templates_loaded
+    assert list((tmp_path / 'jinja').glob('__jinja2_*.cache'))
+
+
+def test_readyz_waits_for_warm_up(tmp_path):
+    app = make_app(tmp_path, WARMUP_ON_START=False)
+    client = app.test_client()
+
+    assert app.extensions['warmup'].ready is False
+    assert client.get('/healthz').status_code == 200
+
+    # the probe finishes the warm-up, then reports ready
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+
+
+def test_readyz_reports_unreachable_db(tmp_path):
+    app = make_app(tmp_path, WARMUP_ON_START=False,
+                   SQLALCHEMY_DATABASE_URI='sqlite:////nonexistent/dir/x.db')
+
+    response = app.test_client().get('/readyz')
+
+    assert response.status_code == 503
+    assert response.json['pool_primed'] is False
+    assert response.json['templates'] > 0
+
+
+def test_shared_or_foreign_cache_dir_is_refused(tmp_path):
+    cache_dir = tmp_path / 'jinja'
+    cache_dir.mkdir()
+    cache_dir.chmod(0o777)
+
+    app = make_app(tmp_path)
+
+    assert app.jinja_env.bytecode_cache is None
+    assert app.extensions['warmup'].ready is True
+    assert not list(cache_dir.glob('*.cache'))
@@ -0,0 +1,219 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from os import getpid
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import bindparam, select, update
+
+from models import Post, db
+
+
+class _Shard:
+    """A single lock-protected bucket of pending view increments."""
+
+    __slots__ = ('lock', 'pending')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Counter = Counter()
+
+
+class ViewCounter:
+    """Write-behind buffer for post view counts.
+
+    Increments are aggregated in memory across a fixed number of shards
+    (picked by post id) so concurrent requests rarely contend on the same
+    lock. Pending counts are written to the ``Posts`` table in a single
+    batched ``UPDATE ... SET views = views + n`` either every
+    ``VIEW_COUNTER_FLUSH_INTERVAL`` seconds, once
+    ``VIEW_COUNTER_FLUSH_THRESHOLD`` increments are pending, or when the
+    worker shuts down. Each flush also refreshes the cached "most read"
+    list, and a list older than one flush interval is re-read on access,
+    so even a worker that never records a view (and so never flushes)
+    serves totals, edits and deletions at most one interval stale.
+    """
+
+    def __init__(self, app: Optional[Flask] = None, shards: int = 16):
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+        self._flush_lock = threading.Lock()
+        self._size_lock = threading.Lock()
+        self._pending_total: int = 0
+        self._top: Optional[List[Tuple[int, str, int]]] = None
+        self._top_read_at: float = 0.0
+        self._timer: Optional[threading.Thread] = None
+        self._timer_pid: Optional[int] = None
+        self._stop = threading.Event()
+        self.app: Optional[Flask] = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.config.setdefault('VIEW_COUNTER_FLUSH_INTERVAL', 10.0)
+        app.config.setdefault('VIEW_COUNTER_FLUSH_THRESHOLD', 500)
+        app.config.setdefault('VIEW_COUNTER_TOP_N', 5)
+        app.extensions['view_counter'] = self
+        self.app = app
+
+        atexit.register(self.shutdown)
+
+    # recording
+
+    def incr(self, post_id: int, amount: int = 1) -> None:
+        """Record ``amount`` views of ``post_id`` without touching the DB."""
+
+        shard = self._shards[post_id % len(self._shards)]
+        with shard.lock:
+            shard.pending[post_id] += amount
+
+        with self._size_lock:
+            self._pending_total += amount
+            over_threshold = self._pending_total >= \
+                self.app.config['VIEW_COUNTER_FLUSH_THRESHOLD']
+
+        self._ensure_timer()
+        if over_threshold:
+            self.flush()
+
+    def pending(self, post_id: int) -> int:
+        """Return views of ``post_id`` recorded here but not yet flushed."""
+
+        shard = self._shards[post_id % len(self._shards)]
+        with shard.lock:
+            return shard.pending.get(post_id, 0)
+
+    # flushing
+
+    def _drain(self) -> Dict[int, int]:
+        drained: Dict[int, int] = {}
+        for shard in self._shards:
+            with shard.lock:
+                if shard.pending:
+                    drained.update(shard.pending)
+                    shard.pending = Counter()
+
+        with self._size_lock:
+            self._pending_total = 0
+
+        return drained
+
+    def _restore(self, drained: Dict[int, int]) -> None:
+        for post_id, amount in drained.items():
+            shard = self._shards[post_id % len(self._shards)]
+            with shard.lock:
+                shard.pending[post_id] += amount
+
+        with self._size_lock:
+            self._pending_total += sum(drained.values())
+
+    def flush(self) -> int:
+        """Write all pending increments in one batched UPDATE.
+
+        Returns:
+            int: Number of posts whose counters were updated
+        """
+
+        with self._flush_lock:
+            drained = self._drain()
+
+            with self.app.app_context():
+                if drained:
+                    stmt = (
+                        update(Post.__table__)
+                        .where(Post.__table__.c.id == bindparam('post_id'))
+                        .values(views=Post.__table__.c.views +
+                                bindparam('amount'))
+                    )
+                    try:
+                        with db.engine.begin() as conn:
+                            conn.execute(stmt, [
+                                {'post_id': post_id, 'amount': amount}
+                                for post_id, amount in drained.items()
+                            ])
+                    except Exception:
+                        # keep the counts for the next attempt
+                        self._restore(drained)
+                        self.app.logger.exception(
+                            'Failed to flush %d view counters', len(drained))
+                        return 0
+
+                self._refresh_top()
+
+            return len(drained)
+
+    def _refresh_top(self) -> None:
+        # own connection so a flush triggered mid-request leaves the
+        # request's session alone
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                select(Post.id, Post.title, Post.views)
+                .where(Post.hidden.is_(False))
+                .order_by(Post.views.desc(), Post.id.desc())
+                .limit(self.app.config['VIEW_COUNTER_TOP_N'])
+            ).all()
+        self._top = [(row.id, row.title, row.views) for row in rows]
+        self._top_read_at = time.monotonic()
+
+    def _top_expired(self) -> bool:
+        if self._top is None:
+            return True
+
+        interval = self.app.config['VIEW_COUNTER_FLUSH_INTERVAL']
+        return bool(interval) and \
+            time.monotonic() - self._top_read_at >= interval
+
+    def top_posts(self) -> List[Tuple[int, str, int]]:
+        """Return the precomputed ``(id, title, views)`` most-read list."""
+
+        if self._top_expired():
+            with self._flush_lock:
+                if self._top_expired():
+                    self._refresh_top()
+
+        return self._top
+
+    def invalidate(self) -> None:
+        """Drop the cached top list, e.g. after a post is deleted."""
+
+        self._top = None
+
+    # background flusher
+
+    def _ensure_timer(self) -> None:
+        interval = self.app.config['VIEW_COUNTER_FLUSH_INTERVAL']
+        if not interval or self._timer_pid == getpid():
+            return
+
+        # threads do not survive fork, so every worker starts its own
+        with self._size_lock:
+            if self._timer_pid == getpid():
+                return
+            self._timer_pid = getpid()
+            self._stop = threading.Event()
+            self._timer = threading.Thread(
+                target=self._run, args=(interval, self._stop),
+                name='view-counter-flush', daemon=True)
+            self._timer.start()
+
+    def _run(self, interval: float, stop: threading.Event) -> None:
+        while not stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('View counter flush failed')
+
+    def shutdown(self) -> None:
+        """Stop the background flusher and write what is still pending."""
+
+        self._stop.set()
+        if self.app is None or not self._pending_total:
+            return
+
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception('Final view counter flush failed')
+
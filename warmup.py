@@ -0,0 +1,149 @@
+import os
+import stat
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+
+from models import db
+
+# Bootstrap-Flask also ships Bootstrap 4 templates the app never renders
+SKIP_TEMPLATE_PREFIXES = ('bootstrap/', 'bootstrap4/')
+
+
+def private_dir(directory: str) -> bool:
+    """Create ``directory`` if needed and check only we can write to it.
+
+    Jinja executes whatever it finds in its bytecode cache, so a directory
+    that another local user created first, or can write to, must not be
+    used.
+    """
+
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & 0o022:
+        return False
+
+    return not hasattr(os, 'getuid') or info.st_uid == os.getuid()
+
+
+class WarmUp:
+    """Startup work that keeps cold workers off the request path.
+
+    * compiled templates are written to a filesystem bytecode cache shared
+      by every worker on the host (``<instance path>/jinja-cache`` unless
+      configured, and only if the process user owns it), so only the first
+      process ever parses ``base.html`` and the Bootstrap-Flask macros;
+    * every template is loaded once at startup instead of on the first
+      request that happens to render it;
+    * the DB pool is filled with ready connections.
+
+    ``ready`` only turns true once all of that succeeded; ``/readyz``
+    reports it so a load balancer can hold traffic until then.
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self._lock = threading.Lock()
+        self.templates_loaded: int = 0
+        self.pool_primed: bool = False
+        self.timings: Dict[str, float] = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        # None picks the default below, an empty string disables the cache
+        app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', None)
+        app.config.setdefault('WARMUP_ON_START', True)
+        app.config.setdefault('WARMUP_POOL_CONNECTIONS', 2)
+        app.extensions['warmup'] = self
+        self.app = app
+
+        cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+        if cache_dir is None:
+            cache_dir = os.path.join(app.instance_path, 'jinja-cache')
+        if cache_dir:
+            try:
+                usable = private_dir(cache_dir)
+            except OSError:
+                usable = False
+
+            if usable:
+                app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+                    cache_dir)
+            else:
+                app.logger.warning(
+                    'Jinja bytecode cache dir %s is not a private directory '
+                    'of this user; not caching templates', cache_dir)
+
+        if app.config['WARMUP_ON_START']:
+            self.run()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.templates_loaded) and self.pool_primed
+
+    def load_templates(self) -> int:
+        """Compile every template the app can render."""
+
+        env = self.app.jinja_env
+        names = [name for name in env.list_templates()
+                 if name.endswith('.html')
+                 and not name.startswith(SKIP_TEMPLATE_PREFIXES)]
+        for name in names:
+            env.get_template(name)
+
+        return len(names)
+
+    def prime_pool(self) -> None:
+        """Open the configured number of connections per engine.
+
+        They are all checked out at once so the pool really creates that
+        many, then returned to it for the first requests to reuse.
+        """
+
+        wanted = self.app.config['WARMUP_POOL_CONNECTIONS']
+        with self.app.app_context():
+            for engine in db.engines.values():
+                size = getattr(engine.pool, 'size', lambda: 1)()
+                connections = [engine.connect()
+                               for _ in range(max(1, min(wanted, size)))]
+                try:
+                    for connection in connections:
+                        connection.execute(text('SELECT 1'))
+                finally:
+                    for connection in connections:
+                        connection.close()
+
+    def run(self) -> bool:
+        """Run whatever warm-up steps have not succeeded yet.
+
+        Returns:
+            bool: Whether the app is ready to take traffic
+        """
+
+        with self._lock:
+            if not self.templates_loaded:
+                started = time.perf_counter()
+                self.templates_loaded = self.load_templates()
+                self.timings['templates'] = time.perf_counter() - started
+
+            if not self.pool_primed:
+                started = time.perf_counter()
+                try:
+                    self.prime_pool()
+                except Exception:
+                    self.app.logger.exception('Failed to prime DB pool')
+                else:
+                    self.pool_primed = True
+                    self.timings['pool'] = time.perf_counter() - started
+
+        return self.ready
+
+    def reset_pool(self) -> None:
+        """Mark the pool cold, e.g. after its connections were disposed."""
+
+        self.pool_primed = False